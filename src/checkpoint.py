@@ -0,0 +1,81 @@
+'''
+Checkpoints of sPENminer, to resume mining a stream after a crash or preemption.
+
+A checkpoint is a pickle of the miner (its snippet statistics and its Extractor's window and compatability links), without its stream,
+along with the number of updates mined so far, the vocabularies of an interned stream, and a fingerprint of the stream and the miner's parameters.
+Resuming skips the mined updates, so a resumed run gives the same results as an uninterrupted run, and it is refused if the stream
+or the parameters differ, since the skipped updates would not be the mined ones.
+'''
+
+import os
+import pickle
+from stream import Vocabulary, binary_path
+
+# the parameters of sPENminer that a checkpoint has to be resumed with
+PARAMETERS = ('view', 'window_size', 'max_size', 'alpha', 'beta', 'gamma', 'grid', 'budget', 'capacity', 'batch_timestamps')
+
+def fingerprint(stream):
+    '''
+    :return: the arguments that the stream was opened with (see Stream.args), and the path, size, and modification time of its edgelist
+    (or of its binary version, if the edgelist is gone), or None for a live stream.
+    '''
+    args = getattr(stream, 'args', None)
+    if args is None:
+        return None
+    (edgelist, member), cols_dir = binary_path(args['name'], args['ext'])
+    if not os.path.exists(edgelist) and args['binary']:
+        edgelist = os.path.join(cols_dir, 'vocab.json')
+    stat = os.stat(edgelist)
+    return {'args': dict(args), 'path': os.path.abspath(edgelist), 'member': member, 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+def save(miner, path):
+    '''
+    Writes a checkpoint of the miner, atomically: a crash while writing leaves the previous checkpoint.
+
+    :miner: a sPENminer, between updates.
+    :path: where to write the checkpoint.
+    '''
+    stream = miner.stream
+    state = {'miner': miner,
+             'num_updates': miner.num_updates,
+             'stream': fingerprint(stream),
+             'parameters': {parameter: getattr(miner, parameter) for parameter in PARAMETERS},
+             'vocabularies': [vocabulary.tokens for vocabulary in (stream.nodes, stream.labels, stream.edge_labels)]}
+    tmp_path = '{}.tmp'.format(path)
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def load(path, stream, miner=None):
+    '''
+    Reads a checkpoint, and prepares the stream to continue after the updates that were mined.
+
+    :path: the path of the checkpoint.
+    :stream: the Stream that the miner was mining (opened as before, e.g., with the same time range and interning).
+    :miner: if given, then the miner configured for this run, whose parameters (see PARAMETERS) must be those of the checkpoint.
+
+    :return: the miner of the checkpoint.
+    '''
+    with open(path, 'rb') as f:
+        state = pickle.load(f)
+    saved = state.get('stream')
+    current = fingerprint(stream)
+    if saved != current:
+        if saved is None or current is None:
+            differences = ['stream']
+        else:
+            differences = [key for key in current if key != 'args' and saved.get(key) != current[key]]
+            differences += [arg for arg in current['args'] if saved['args'].get(arg) != current['args'][arg]]
+        raise ValueError('The checkpoint {} was saved from a different stream ({} differ), so it cannot be resumed.'.format(path, ', '.join(differences)))
+    if miner is not None:
+        differences = [parameter for parameter in PARAMETERS if state['parameters'][parameter] != getattr(miner, parameter)]
+        if differences:
+            raise ValueError('The checkpoint {} was saved with different parameters ({} differ), so it cannot be resumed.'.format(path, ', '.join(differences)))
+    miner = state['miner']
+    miner.stream = stream
+    if not stream.binary:
+        stream.nodes, stream.labels, stream.edge_labels = (Vocabulary(tokens) for tokens in state['vocabularies'])
+    stream.skip(state['num_updates'])
+    return miner
@@ -0,0 +1,110 @@
+from array import array
+from math import ceil, e, log as ln
+from zlib import adler32, crc32
+
+class CountMinSketch:
+    '''
+    A Count-Min sketch of the statistics of the snippets that sPENminer evicts (see sPENminer's capacity).
+
+    Each snippet hashes to one cell in each of depth rows of width cells, and each cell keeps, over the snippets that hash to it,
+    the earliest first occurrence, and the latest last occurrence and the largest frequency, number of gaps, and sum of gap * log2(gap) (see sPENminer.S()).
+    So the estimates of a snippet, taken over its cells, are bounds: its first occurrence is at or after the estimate, and its last occurrence,
+    frequency, and number of gaps are at most the estimates. With width = ceil(e / epsilon) and depth = ceil(ln(1 / delta)),
+    the frequency is overestimated by at most epsilon * N with probability at least 1 - delta, where N is the total frequency of the evicted snippets.
+
+    Once many snippets are evicted, few cells are empty, so a snippet that was never evicted would get the bounds of the snippets that share its cells.
+    So the sketch also keeps a Bloom filter of the evicted snippets, and only estimates the snippets in it. The filter has FILTER_BITS bits per cell,
+    and a false positive rate of about (1 - exp(-FILTER_HASHES * n / bits)) ** FILTER_HASHES after n distinct evictions.
+    '''
+    EMPTY = (1 << 63) - 1
+    FILTER_BITS = 64
+    FILTER_HASHES = 7
+
+    def __init__(self, epsilon=1e-4, delta=0.01):
+        '''
+        :epsilon: the error of the frequencies, relative to the total frequency of the evicted snippets.
+        :delta: the probability that the error is larger.
+        '''
+        self.width = ceil(e / epsilon)
+        self.depth = max(1, ceil(ln(1 / delta)))
+        cells = self.width * self.depth
+        self.first_occs = array('q', [self.EMPTY]) * cells
+        self.last_occs = array('q', [-self.EMPTY]) * cells
+        self.num_occs = array('d', [0]) * cells
+        self.num_gaps = array('q', [0]) * cells
+        self.filter_bits = self.FILTER_BITS * cells
+        self.filter = bytearray(self.filter_bits // 8)
+        self.gap_logs = array('d', [0]) * cells
+        self.num_adds = 0
+        self.num_estimates = 0
+
+    def hashes(self, snippet):
+        '''
+        :return: two hashes of the snippet, for double hashing (see cells() and bits()).
+
+        The snippet is hashed from its repr, so that the hashes are the same across runs (unlike hash(), which is salted for strings).
+        '''
+        data = repr(snippet).encode()
+        return crc32(data), adler32(data) | 1
+
+    def cells(self, h1, h2):
+        '''
+        :return: the index of the cell in each row of a snippet with hashes h1 and h2.
+        '''
+        width = self.width
+        return [row * width + (h1 + row * h2) % width for row in range(self.depth)]
+
+    def bits(self, h1, h2):
+        '''
+        :return: the bits of the filter of a snippet with hashes h1 and h2 (after the ones that index its cells).
+        '''
+        filter_bits = self.filter_bits
+        return [(h1 + k * h2) % filter_bits for k in range(self.depth, self.depth + self.FILTER_HASHES)]
+
+    def add(self, snippet, first_occ, last_occ, num_occs, num_gaps, gap_logs):
+        '''
+        Summarizes the statistics of an evicted snippet.
+        '''
+        h1, h2 = self.hashes(snippet)
+        for bit in self.bits(h1, h2):
+            self.filter[bit >> 3] |= 1 << (bit & 7)
+        for cell in self.cells(h1, h2):
+            if first_occ < self.first_occs[cell]:
+                self.first_occs[cell] = first_occ
+            if last_occ > self.last_occs[cell]:
+                self.last_occs[cell] = last_occ
+            if num_occs > self.num_occs[cell]:
+                self.num_occs[cell] = num_occs
+            if num_gaps > self.num_gaps[cell]:
+                self.num_gaps[cell] = num_gaps
+            if gap_logs > self.gap_logs[cell]:
+                self.gap_logs[cell] = gap_logs
+        self.num_adds += 1
+
+    def estimate(self, snippet):
+        '''
+        :return: the bounds on the first occurrence, last occurrence, frequency, number of gaps, and sum of gap * log2(gap) of the snippet,
+        or None if the snippet was never evicted (it is not in the filter, or the bounds contradict each other).
+        A snippet that was never evicted still gets (overestimated) bounds if it is a false positive of the filter.
+        '''
+        h1, h2 = self.hashes(snippet)
+        filter = self.filter
+        if not all(filter[bit >> 3] & (1 << (bit & 7)) for bit in self.bits(h1, h2)):
+            return None
+        cells = self.cells(h1, h2)
+        first_occ = max(self.first_occs[cell] for cell in cells)
+        last_occ = min(self.last_occs[cell] for cell in cells)
+        if first_occ > last_occ:
+            return None
+        self.num_estimates += 1
+        return (first_occ,
+                last_occ,
+                min(self.num_occs[cell] for cell in cells),
+                min(self.num_gaps[cell] for cell in cells),
+                min(self.gap_logs[cell] for cell in cells))
+
+    def report(self):
+        '''
+        :return: the size of the sketch, and how many snippets were evicted into it and estimated from it.
+        '''
+        return 'Count-Min sketch: {} x {} cells, {} evictions, {} readmissions'.format(self.depth, self.width, self.num_adds, self.num_estimates)
@@ -0,0 +1,27 @@
+from itertools import product
+
+def persistence_grid(W, F, S, exponents):
+    '''
+    Computes the persistence of snippets for several triples of exponents at once, from its components (see sPENminer.P()),
+    which do not depend on the exponents. Each distinct power of each component is computed once.
+
+    :W, F, S: NumPy arrays of the components of the snippets' persistence.
+    :exponents: a list of (alpha, beta, gamma).
+
+    :return: a list of arrays of the snippets' persistence, one for each triple of exponents.
+    '''
+    powers = dict()
+    def power(name, X, exponent):
+        if (name, exponent) not in powers:
+            powers[(name, exponent)] = X ** exponent
+        return powers[(name, exponent)]
+    return [power('W', W, alpha) * power('F', F, beta) * power('S', S, gamma) for alpha, beta, gamma in exponents]
+
+def parse_grid(alphas, betas, gammas):
+    '''
+    :alphas, betas, gammas: comma-separated values of each exponent, e.g., '0.5,1,2', or None for the default exponent.
+
+    :return: the list of all their (alpha, beta, gamma) combinations. Given values are floats, and the default is the int 1,
+    so that the output files are named as before the grid (e.g., exps_1_1_1 by default, and exps_2.0_1_1 for alpha 2).
+    '''
+    return list(product(*([1] if values is None else [float(value) for value in values.split(',')] for values in (alphas, betas, gammas))))
@@ -1,103 +1,236 @@
 from itertools import combinations
+from random import Random
+from collections import deque
+from lru_cache import LRUCache
+
+class Singleton:
+    '''
+    A singleton activity snippet (i.e., containing just one update) in the window.
+    '''
+    __slots__ = ('age', 'update', 'nodes', 'snippets', 'labels', 'names')
+
+    def __init__(self, age, update, snippets, labels):
+        '''
+        :age: the snippet's age (i.e., the time of its update)
+        :update: the update of the snippet
+        :snippets: the snippet in each of the Extractor's views
+        :labels: the snippet in the label view (from which larger snippets are relabeled in the order view)
+        '''
+        self.age = age
+        self.update = update
+        # the nodes of the update, to check whether singletons are compatible
+        self.nodes = (update[1], update[2])
+        self.snippets = snippets
+        self.labels = labels
+        # the snippet in each view as a string of the edgelist's tokens, when it is first needed (see Extractor.name())
+        self.names = None
+
+    @property
+    def snippet(self):
+        '''
+        The snippet in the Extractor's (first) view.
+        '''
+        return self.snippets[0]
 
 class Extractor:
     '''
     A class that extracts sequences from a window and does book keeping on them.
 
     In general, it works like this:
-    1. Maintain a list of singleton sequences of updates [oldest, ..., newest].
+    1. Maintain a window of singleton sequences of updates [oldest, ..., newest].
     2. When a new singleton arrives, append it to the end.
-    3. Check the front of the array to see how many old ones are stale (i.e., have left the window) and chop them off the list: [#stale:].
+    3. Check the front of the window to see how many old ones are stale (i.e., have left the window) and chop them off.
     4. Maintain a compatability graph among singletons based off whether they share nodes and can form larger snippets.
+       The singletons that share nodes with a new one are found by scanning the window, or, in windows of more than INDEX_SIZE singletons,
+       with an index from each node to its singletons in the window (which costs more than a scan of a small window to keep up).
     5. Compute all connected subgraphs of this compatability graph (i.e., all valid snippets) and book-keep on all those that contain the new update.
+
+    The window and compatability graph do not depend on the view, so snippets can be extracted for several views at once, each of which
+    is book-kept by its own sinks (see MinerGroup). Likewise, a window holds any smaller window, so the extractor keeps the largest window
+    of its sinks, and a snippet is only book-kept by the sinks whose window holds all of its updates.
+
+    With a budget, at most budget of the singletons that share nodes with the new one are kept (by reservoir sampling) for step 5, so the
+    work per update stays bounded in bursts (e.g., a hub node getting many edges at the same time). Only the snippets whose singletons that
+    share nodes with the new one were all kept are enumerated, and each is book-kept with the inverse of the probability of that
+    (Horvitz-Thompson), so the expected frequencies are unbiased.
     '''
-    def __init__(self, method):
+    # the maximum number of items in the extractor's cache (of order view snippets)
+    CACHE_SIZE = 1 << 12
+    # the number of singletons in the window above which the node index is kept (and below half of which it is dropped)
+    INDEX_SIZE = 64
+
+    def __init__(self, method, sinks=None):
         '''
-        :book_keeping: a function the performs the logic of book keeping
+        :method: the miner to extract snippets for (or a MinerGroup), which keeps the time of the current update
+        :sinks: if given, then a list of (view, window_size, book_keeping) to extract snippets for several views and window sizes in one
+        pass, where book_keeping is a function that performs the logic of book keeping; by default, the method's view, window_size, and book_keeping
         '''
-        self.book_keeping = method.book_keeping
-        self.singletons = list()
-        self.compatability_links = list()
-        self.window_size = method.window_size
+        if sinks is None:
+            sinks = [(method.view, method.window_size, method.book_keeping)]
+        # the distinct views to build snippets in, in the order of the sinks
+        self.views = list()
+        for view, _, _ in sinks:
+            if view not in self.views:
+                self.views.append(view)
+        # (the index of the view, window_size, book_keeping) for each sink
+        self.sinks = [(self.views.index(view), window_size, book_keeping) for view, window_size, book_keeping in sinks]
+        self.book_keeping = self.sinks[0][2]
+        # deques, which are chopped at the front in O(1) and indexed from both ends (like self.singletons[-k]) in C
+        self.singletons = deque()
+        self.compatability_links = deque()
+        # node -> sequence numbers of the singletons in the window that contain it, oldest first (None while the window is small, see index())
+        self.node_index = None
+        # the sequence number of singletons[0]
+        self.first_seq = 0
+        self.window_size = max(window_size for _, window_size, _ in self.sinks)
         self.max_size = method.max_size
-        self.view = method.view
+        self.view = self.views[0]
         # for compatability graph
         self.method = method
 
-        self.size_2_subsets_map = dict()
+        # the maximum number of compatible singletons to expand per update (None for no limit)
+        self.budget = method.budget
+        # seeded, so that sampled runs are reproducible
+        self.random = Random(0)
+        # the numbers of compatible and kept singletons of the current update
+        self.num_compatible = 0
+        self.num_kept = 0
+        # the compatability links of the current update that were kept and skipped
+        self.sampled_links = list()
+        self.skipped_links = set()
+        # the number of updates that exceeded the budget, and of compatability links that were skipped
+        self.num_sampled_updates = 0
+        self.num_skipped_links = 0
+
+        # label view snippet -> order view snippet
+        self.order_forms = LRUCache(self.CACHE_SIZE)
+
+    def render(self, snippet):
+        '''
+        :snippet: a snippet as built by the extractor, i.e., a flat tuple (op, u, v, r) * size, where u and v are the nodes' ids, labels, or relabelings, depending on the view.
+
+        :return: the snippet as a string, e.g., '1_1_2_1|1_3_1_1' (see Stream.decode() for interned streams).
+        '''
+        return '|'.join('{}_{}_{}_{}'.format(*snippet[i:i + 4]) for i in range(0, len(snippet), 4))
+
+    def parse(self, snippet):
+        '''
+        The inverse of render() for streams that are not interned (e.g., to query a snippet by its name).
+
+        :snippet: a snippet as a string, e.g., '1_1_2_1|1_3_1_1'.
+
+        :return: the snippet as built by the extractor.
+        '''
+        parsed = list()
+        for update in snippet.split('|'):
+            op, u, v, r = update.split('_')
+            if self.view == 'order':
+                u, v = int(u), int(v)
+            parsed += [op, u, v, r]
+        return tuple(parsed)
 
     def build_singleton(self, update, age):
         '''
-        Constructs a tuple representation of a singleton activity snippet (i.e., containing just one update)
+        Constructs a singleton activity snippet (i.e., containing just one update)
 
         :update: the update of the snippet
         :age: the snippet's age
 
-        :return: a tuple representation of a singleton activity snippet containing the update
-        '''
-        nodes = {update[1], update[2]}
-        if self.view == 'id':
-            snippet = f'{update[0]}_{update[1]}_{update[2]}_{update[6]}'
-            names = None
-        elif self.view == 'label':
-            snippet = f'{update[0]}_{update[4]}_{update[5]}_{update[6]}'
-            names = None
-        elif self.view == 'order':
-            if update[4] == update[5]:
-                snippet = f'{update[0]}_{0}_{0}_{update[6]}'
-                names = {update[4]: 0}
-            else:
-                snippet = f'{update[0]}_{0}_{1}_{update[6]}'
-                names = {update[4]: 0, update[5]: 1}
-        return (age, update, nodes, names, snippet)
-
-    def build_snippet_from(self, singleton, new_update, view, snippet=None, names=None):
-        new_snippet = singleton[-1] if not snippet else snippet
-        if view == 'id':
-            new_snippet += f'|{new_update[0]}_{new_update[1]}_{new_update[2]}_{new_update[6]}'
-        elif view == 'label':
-            new_snippet += f'|{new_update[0]}_{new_update[4]}_{new_update[5]}_{new_update[6]}'
-        elif view == 'order':
-            if not names:
-                names = dict(singleton[-2])
-            if new_update[4] not in names and new_update[5] not in names:
-                if new_update[4] == new_update[5]:
-                    names[new_update[4]] = len(names)
-                else:
-                    names[new_update[4]] = len(names)
-                    names[new_update[5]] = len(names)
-            elif new_update[4] not in names:
-                names[new_update[4]] = len(names)
-            elif new_update[5] not in names:
-                names[new_update[5]] = len(names.values())
-            new_snippet += f'|{new_update[0]}_{names[new_update[4]]}_{names[new_update[5]]}_{new_update[6]}'
+        :return: a Singleton containing the update
+        '''
+        labels = (update[0], update[4], update[5], update[6])
+        snippets = list()
+        for view in self.views:
+            if view == 'id':
+                snippets.append((update[0], update[1], update[2], update[6]))
+            elif view == 'label':
+                snippets.append(labels)
+            elif view == 'order':
+                snippets.append(self.order_form(labels))
+        return Singleton(age, update, tuple(snippets), labels)
+
+    def order_form(self, labels):
+        '''
+        Relabels the nodes of a snippet by order of first appearance, memoized because the relabeling only depends on
+        which of the snippet's node labels are equal (so repeated motifs cost a lookup).
+
+        :labels: a snippet in the label view
+
+        :return: the snippet in the order view
+        '''
+        snippet = self.order_forms.get(labels)
+        if snippet is None:
+            names = dict()
+            snippet = list()
+            for i in range(0, len(labels), 4):
+                op, u, v, r = labels[i:i + 4]
+                u = names.setdefault(u, len(names))
+                v = names.setdefault(v, len(names))
+                snippet += (op, u, v, r)
+            snippet = tuple(snippet)
+            self.order_forms[labels] = snippet
+        return snippet
+
+    def join(self, sequences, v=0):
+        '''
+        :sequences: singletons, in the order of their updates in the snippet
+        :v: the index of the view to build the snippet in
+
+        :return: the snippet of their updates
+        '''
+        if len(sequences) == 1:
+            return sequences[0].snippets[v]
+        if self.views[v] == 'order':
+            labels = sequences[0].labels
+            for sequence in sequences[1:]:
+                labels += sequence.labels
+            return self.order_form(labels)
+        new_snippet = sequences[0].snippets[v]
+        for sequence in sequences[1:]:
+            new_snippet += sequence.snippets[v]
         return new_snippet
 
+    def emit(self, sequences, weight=1, order=None):
+        '''
+        Builds the snippet of some singletons in each view, and does book keeping on it with the view's sinks whose window holds it.
+
+        :sequences: the singletons of the snippet
+        :weight: the number of occurrences that the snippet counts for (see weight())
+        :order: if given, then a function (sequences, v) that sorts the singletons for the view with index v; otherwise, they are in order
+        '''
+        if len(self.sinks) == 1:
+            self.book_keeping(self.join(order(sequences, 0) if order else sequences), weight)
+            return
+        # the time from the snippet's oldest update to the new one
+        span = self.method.time - min(sequence.age for sequence in sequences)
+        built = [None] * len(self.views)
+        for v, window_size, book_keeping in self.sinks:
+            if span > window_size:
+                continue
+            if built[v] is None:
+                built[v] = self.join(order(sequences, v) if order else sequences, v)
+            book_keeping(built[v], weight)
+
     def extract_sequences(self, update):
         # add a sequence with only this update
         self.create_singleton(update)
         if self.max_size > 1:
             if self.max_size == 2:
-                num_stale = 0
-                for sequence in self.singletons[:-1]: # check all singletons except the new one
-                    # check if sequence is stale
-                    if self.method.time - sequence[0] > self.window_size:
-                        # sequence is stale
-                        num_stale += 1
-                    else: # sequence is valid
-                        # if the new update is connected to this sequence, then we'll need to create a new sequence with this update
-                        # condition 1: the sequence is a singleton (we're only iterating over them) and condition 2: the two singletons are compatable
-                        if update[1] in sequence[2] or update[2] in sequence[2]:
-                            # build a snippet for the new sequence of updates
-                            snippet = self.build_snippet_from(sequence, update, self.view)
-                            # update the sequence's snippet frequencies
-                            self.book_keeping(snippet)
-                self.singletons = self.singletons[num_stale:]
+                self.expire_singletons()
+                seqs = self.sample(self.compatible_seqs(update))
+                weight = self.weight(1)
+                for seq in seqs:
+                    # build a snippet for the new sequence of updates
+                    # update the sequence's snippet frequencies
+                    self.emit((self.singletons[seq - self.first_seq], self.singletons[-1]), weight)
             else:
                 # add pairs
                 self.create_size_2_snippets(update)
                 # add bigger than pairs
-                self.create_size_3_snippets()
+                if self.max_size == 3:
+                    self.create_size_3_snippets()
+                else:
+                    self.create_larger_snippets()
 
     def create_singleton(self, update):
         '''
@@ -108,11 +241,13 @@ class Extractor:
         # create a new sequence that contains only this update
         new_singleton = self.build_singleton(update, age=self.method.time)
         if self.max_size > 1:
+            if self.node_index is not None:
+                self.index_singleton(update, self.first_seq + len(self.singletons))
             self.singletons.append(new_singleton)
             if self.max_size > 2:
                 self.compatability_links.append(list())
         # update the sequence's snippet frequencies
-        self.book_keeping(new_singleton[-1])
+        self.emit((new_singleton,))
 
     def create_size_2_snippets(self, update):
         '''
@@ -120,39 +255,156 @@ class Extractor:
 
         :update: the update of the snippet
         '''
-        num_stale = 0
-        idx_of_new = len(self.singletons) - 1
-        for i, sequence in enumerate(self.singletons[:-1]): # check all singletons except the new one
-            # check if sequence is stale
-            if self.method.time - sequence[0] > self.window_size:
-                # sequence is stale
-                num_stale += 1
-            else: # sequence is valid
-                # if the new update is connected to this sequence, then we'll need to create a new sequence with this update
-                # condition 1: the sequence is a singleton (we're only iterating over them) and condition 2: the two singletons are compatable
-                if update[1] in sequence[2] or update[2] in sequence[2]:
-                    self.compatability_links[-1].append(idx_of_new - i)
-                    # build a snippet for the new sequence of updates
-                    snippet = self.build_snippet_from(sequence, update, self.view)
-                    # update the sequence's snippet frequencies
-                    self.book_keeping(snippet)
-        self.singletons = self.singletons[num_stale:]
-        self.compatability_links = self.compatability_links[num_stale:]
+        self.expire_singletons()
+        seq_of_new = self.first_seq + len(self.singletons) - 1
+        seqs = self.compatible_seqs(update)
+        links = self.compatability_links[-1]
+        links.extend(seq_of_new - seq for seq in seqs)
+        sampled = self.sample(seqs)
+        if sampled is seqs:
+            self.sampled_links = links
+            self.skipped_links = set()
+        else:
+            self.sampled_links = [seq_of_new - seq for seq in sampled]
+            self.skipped_links = set(links).difference(self.sampled_links)
+        weight = self.weight(1)
+        for seq in sampled:
+            # build a snippet for the new sequence of updates
+            # update the sequence's snippet frequencies
+            self.emit((self.singletons[seq - self.first_seq], self.singletons[-1]), weight)
+
+    def sample(self, seqs):
+        '''
+        Keeps at most budget of the compatible singletons, by reservoir sampling.
+
+        :seqs: the sequence numbers of the singletons that are compatible with the new one, oldest first
+
+        :return: the sequence numbers of the kept singletons, oldest first (seqs itself if they are all kept)
+        '''
+        self.num_compatible = len(seqs)
+        if self.budget is None or len(seqs) <= self.budget:
+            self.num_kept = len(seqs)
+            return seqs
+        reservoir = seqs[:self.budget]
+        for i in range(self.budget, len(seqs)):
+            j = self.random.randrange(i + 1)
+            if j < self.budget:
+                reservoir[j] = seqs[i]
+        self.num_kept = self.budget
+        self.num_sampled_updates += 1
+        self.num_skipped_links += len(seqs) - self.budget
+        return sorted(reservoir)
+
+    def weight(self, j):
+        '''
+        :j: the number of singletons in a snippet that are compatible with the new one
+
+        :return: the inverse of the probability that they were all kept (1 if none were skipped)
+        '''
+        if self.num_kept == self.num_compatible:
+            return 1
+        weight = 1
+        for i in range(j):
+            weight *= (self.num_compatible - i) / (self.num_kept - i)
+        return weight
+
+    def expire_singletons(self):
+        '''
+        Chops the stale singletons (i.e., that have left the window) off the front of the window, and removes them from the node index.
+        The new singleton is never stale.
+        '''
+        while len(self.singletons) > 1 and self.method.time - self.singletons[0].age > self.window_size:
+            update = self.singletons.popleft().update
+            if self.node_index is not None:
+                for node in {update[1], update[2]}:
+                    seqs = self.node_index[node]
+                    seqs.popleft()
+                    if not seqs:
+                        del self.node_index[node]
+            if self.max_size > 2:
+                self.compatability_links.popleft()
+            self.first_seq += 1
+
+    def compatible_seqs(self, update):
+        '''
+        :update: the update of the newest singleton
+
+        :return: the sequence numbers of the other singletons in the window that share a node with the update, oldest first
+        '''
+        seq_of_new = self.first_seq + len(self.singletons) - 1
+        if not self.index():
+            u = update[1]
+            v = update[2]
+            # the new singleton shares its own nodes, so it is last
+            seqs = [seq for seq, singleton in enumerate(self.singletons, self.first_seq) if u in singleton.nodes or v in singleton.nodes]
+            seqs.pop()
+            return seqs
+        seqs = self.node_index[update[1]]
+        if update[2] != update[1]:
+            seqs = sorted(set(seqs).union(self.node_index[update[2]]))
+        return [seq for seq in seqs if seq != seq_of_new]
+
+    def index(self):
+        '''
+        Builds the node index when the window grows to more than INDEX_SIZE singletons, and drops it when the window shrinks to less than half of that.
+
+        :return: True if the node index is kept.
+        '''
+        size = len(self.singletons)
+        if self.node_index is None:
+            if size > self.INDEX_SIZE:
+                self.node_index = dict()
+                for seq, singleton in enumerate(self.singletons, self.first_seq):
+                    self.index_singleton(singleton.update, seq)
+        elif 2 * size < self.INDEX_SIZE:
+            self.node_index = None
+        return self.node_index is not None
+
+    def index_singleton(self, update, seq):
+        '''
+        Adds a singleton to the node index.
+
+        :update: the update of the singleton
+        :seq: its sequence number
+        '''
+        for node in {update[1], update[2]}:
+            if node in self.node_index:
+                self.node_index[node].append(seq)
+            else:
+                self.node_index[node] = deque([seq])
+
+    def compatible_singletons(self, update):
+        '''
+        :update: the update of the newest singleton
+
+        :return: the other singletons in the window that share a node with the update, oldest first
+        '''
+        return [self.singletons[seq - self.first_seq] for seq in self.compatible_seqs(update)]
 
     def all_size_2_subsets(self, s):
-        s = tuple(s)
-        if s in self.size_2_subsets_map:
-            return self.size_2_subsets_map[s]
-        res = tuple(combinations(s, 2))
-        self.size_2_subsets_map[s] = res
-        return res
+        '''
+        :s: a list of compatability links
+
+        :return: an iterator over all pairs of the links (not cached: caching the pairs costs memory quadratic in the degree, and is not faster)
+        '''
+        return combinations(s, 2)
+
+    def report(self):
+        '''
+        :return: the size and hit rate of the extractor's cache, and how much was sampled under the budget.
+        '''
+        report = 'Extractor caches: order forms {}.'.format(self.order_forms.report())
+        if self.budget is not None:
+            report += '\nExtractor budget: {} updates sampled, {} compatability links skipped.'.format(self.num_sampled_updates, self.num_skipped_links)
+        return report
 
     def create_size_3_snippets(self):
         '''
         Creates all new size-3 activity snippets, and does book keeping on them.
         '''
         def two_one_hop(seen):
-            for other_two in self.all_size_2_subsets(self.compatability_links[-1]):
+            weight = self.weight(2)
+            for other_two in self.all_size_2_subsets(self.sampled_links):
                 first_offset = -(other_two[0] + 1)
                 second_offset = -(other_two[1] + 1)
                 if first_offset <= second_offset:
@@ -160,58 +412,21 @@ class Extractor:
                 else:
                     idxs = (second_offset, first_offset, -1)
                 seen.add(idxs)
-                # sort first by age, then by snippet if tied
-                singleton_1 = self.singletons[-1]
-                singleton_2 = self.singletons[first_offset]
-                singleton_3 = self.singletons[second_offset]
-                age_1 = singleton_1[0]
-                age_2 = singleton_2[0]
-                age_3 = singleton_3[0]
-
-                one_before_two = age_1 < age_2 or (age_1 == age_2 and singleton_1[-1] < singleton_2[-1])
-                one_before_three = age_1 < age_3 or (age_1 == age_3 and singleton_1[-1] < singleton_3[-1])
-                two_before_three = age_2 < age_3 or (age_2 == age_3 and singleton_2[-1] < singleton_3[-1])
-
-                if one_before_two and one_before_three:
-                    if two_before_three:
-                        triple = (singleton_1, singleton_2, singleton_3)
-                    else:
-                        triple = (singleton_1, singleton_3, singleton_2)
-                elif not one_before_two and two_before_three:
-                    if one_before_three:
-                        triple = (singleton_2, singleton_1, singleton_3)
-                    else:
-                        triple = (singleton_2, singleton_3, singleton_1)
-                else:
-                    if one_before_two:
-                        triple = (singleton_3, singleton_1, singleton_2)
-                    else:
-                        triple = (singleton_3, singleton_2, singleton_1)
-                # triple = tuple(sorted([self.singletons[-1], self.singletons[first_offset], self.singletons[second_offset]], key=lambda it: (it[0], it[-1])))
-                if self.view == 'id':
-                    new_snippet = f'{triple[0][-1]}|{triple[1][-1]}|{triple[2][-1]}'
-                else:
-                    new_singleton = triple[0]
-                    if self.view == 'order':
-                        names = dict(new_singleton[-2])
-                    else:
-                        names = None
-                    new_snippet = new_singleton[-1]
-                    for sequence in triple[1:]:
-                        new_snippet = self.build_snippet_from(None, sequence[1], self.view, snippet=new_snippet, names=names)
                 # update the sequence's snippet frequencies
-                self.book_keeping(new_snippet)
+                self.emit((self.singletons[-1], self.singletons[first_offset], self.singletons[second_offset]), weight, self.order_triple)
 
         def two_hop(seen):
-            # for each singleton that the current is compatable with
-            for link in self.compatability_links[-1]:
+            weight = self.weight(1)
+            # for each (kept) singleton that the current is compatable with
+            for link in self.sampled_links:
                 # negative index to singleton one hop away
                 one_hop_link = -(link + 1)
                 # for reachable singleton in two hops
                 for two_hop in self.compatability_links[one_hop_link]:
                     # negative index to singleton two hops away
                     two_hop_link = -(link + 1 + two_hop)
-                    if -two_hop_link <= len(self.singletons):
+                    # skip singletons that are compatible with the current but were not kept
+                    if -two_hop_link <= len(self.singletons) and link + two_hop not in self.skipped_links:
                         if one_hop_link <= two_hop_link:
                             idxs = (one_hop_link, two_hop_link, -1)
                         else:
@@ -219,46 +434,106 @@ class Extractor:
                         if idxs in seen:
                             continue
                         seen.add(idxs)
-                        # sort first by age, then by snippet if tied
-                        singleton_1 = self.singletons[-1]
-                        singleton_2 = self.singletons[one_hop_link]
-                        singleton_3 = self.singletons[two_hop_link]
-                        age_1 = singleton_1[0]
-                        age_2 = singleton_2[0]
-                        age_3 = singleton_3[0]
-
-                        one_before_two = age_1 < age_2 or (age_1 == age_2 and singleton_1[-1] < singleton_2[-1])
-                        one_before_three = age_1 < age_3 or (age_1 == age_3 and singleton_1[-1] < singleton_3[-1])
-                        two_before_three = age_2 < age_3 or (age_2 == age_3 and singleton_2[-1] < singleton_3[-1])
-
-                        if one_before_two and one_before_three:
-                            if two_before_three:
-                                triple = (singleton_1, singleton_2, singleton_3)
-                            else:
-                                triple = (singleton_1, singleton_3, singleton_2)
-                        elif not one_before_two and two_before_three:
-                            if one_before_three:
-                                triple = (singleton_2, singleton_1, singleton_3)
-                            else:
-                                triple = (singleton_2, singleton_3, singleton_1)
-                        else:
-                            if one_before_two:
-                                triple = (singleton_3, singleton_1, singleton_2)
-                            else:
-                                triple = (singleton_3, singleton_2, singleton_1)
-                        if self.view == 'id':
-                            new_snippet = f'{triple[0][-1]}|{triple[1][-1]}|{triple[2][-1]}'
-                        else:
-                            new_singleton = triple[0]
-                            if self.view == 'order':
-                                names = dict(new_singleton[-2])
-                            else:
-                                names = None
-                            new_snippet = new_singleton[-1]
-                            for sequence in triple[1:]:
-                                new_snippet = self.build_snippet_from(None, sequence[1], self.view, snippet=new_snippet, names=names)
-                        self.book_keeping(new_snippet)
+                        self.emit((self.singletons[-1], self.singletons[one_hop_link], self.singletons[two_hop_link]), weight, self.order_triple)
 
         seen = set()
         two_one_hop(seen)
         two_hop(seen)
+
+    def name(self, singleton, v):
+        '''
+        :singleton: a Singleton in the window
+        :v: the index of the view
+
+        :return: the singleton's snippet in the view as a string of the edgelist's tokens, e.g., '1_1_2_x', which orders the singletons of the same age.
+        The strings are compared rather than the snippets, whose interned codes (or elements, e.g., '2' < '20' but '2_x' > '20_x') order differently.
+        '''
+        names = singleton.names
+        if names is None:
+            stream = self.method.stream
+            if stream is not None and stream.intern:
+                names = [stream.decode(snippet, view) for snippet, view in zip(singleton.snippets, self.views)]
+            else:
+                names = [self.render(snippet) for snippet in singleton.snippets]
+            singleton.names = names
+        return names[v]
+
+    def order_triple(self, sequences, v):
+        '''
+        :sequences: the new singleton and two older ones
+        :v: the index of the view
+
+        :return: the singletons sorted first by age, then by snippet (in the view, see name()) if tied
+        '''
+        singleton_1, singleton_2, singleton_3 = sequences
+        age_1 = singleton_1.age
+        age_2 = singleton_2.age
+        age_3 = singleton_3.age
+
+        one_before_two = age_1 < age_2 or (age_1 == age_2 and self.name(singleton_1, v) < self.name(singleton_2, v))
+        one_before_three = age_1 < age_3 or (age_1 == age_3 and self.name(singleton_1, v) < self.name(singleton_3, v))
+        two_before_three = age_2 < age_3 or (age_2 == age_3 and self.name(singleton_2, v) < self.name(singleton_3, v))
+
+        if one_before_two and one_before_three:
+            if two_before_three:
+                return (singleton_1, singleton_2, singleton_3)
+            return (singleton_1, singleton_3, singleton_2)
+        elif not one_before_two and two_before_three:
+            if one_before_three:
+                return (singleton_2, singleton_1, singleton_3)
+            return (singleton_2, singleton_3, singleton_1)
+        if one_before_two:
+            return (singleton_3, singleton_1, singleton_2)
+        return (singleton_3, singleton_2, singleton_1)
+
+    def older_neighbours(self, seq):
+        '''
+        :seq: the sequence number of a singleton in the window
+
+        :return: the sequence numbers of the older singletons in the window that share a node with it (i.e., its compatability links)
+        '''
+        first_seq = self.first_seq
+        return {seq - link for link in self.compatability_links[seq - first_seq] if seq - link >= first_seq}
+
+    def sort_sequences(self, sequences, v):
+        '''
+        :sequences: singletons, oldest first
+        :v: the index of the view
+
+        :return: the singletons sorted first by age, then by snippet (in the view, see name()) if tied
+        '''
+        return sorted(sequences, key=lambda it: (it.age, self.name(it, v)))
+
+    def create_larger_snippets(self):
+        '''
+        Creates all new activity snippets of sizes 3 to max_size, and does book keeping on them.
+
+        The new snippets are the subsets of the window that the new singleton reaches by following compatability links, which lead
+        from each singleton to older ones (so the snippets of size 3 are those of create_size_3_snippets()).
+        They are enumerated like in ESU (Wernicke, 2006), rooted at the new singleton: a subset is extended by one singleton from its
+        extension set at a time, which is then dropped from the set of its siblings, and only the extension's exclusive neighbours
+        (i.e., not in or linked from the subset) are added to the set. So every subset is reached exactly once, and the work is
+        proportional to the number of new snippets and their links in the window.
+        '''
+
+        seq_of_new = self.first_seq + len(self.singletons) - 1
+        neighbours = {seq_of_new: self.older_neighbours(seq_of_new)}
+        direct = neighbours[seq_of_new]
+        sampled = direct if not self.skipped_links else {seq_of_new - link for link in self.sampled_links}
+
+        def extend(subset, extension, neighbourhood):
+            if len(subset) >= 3:
+                weight = self.weight(sum(seq in direct for seq in subset)) if self.skipped_links else 1
+                self.emit(tuple(self.singletons[seq - self.first_seq] for seq in sorted(subset)), weight, self.sort_sequences)
+            if len(subset) == self.max_size:
+                return
+            extension = list(extension)
+            while extension:
+                seq = extension.pop()
+                if seq not in neighbours:
+                    neighbours[seq] = self.older_neighbours(seq)
+                exclusive = neighbours[seq] - neighbourhood
+                extend(subset + [seq], extension + sorted(exclusive, reverse=True), neighbourhood | exclusive)
+
+        # the singletons that are compatible with the new one but were not kept are in the neighbourhood from the start, so they are never added
+        extend([seq_of_new], sorted(sampled, reverse=True), direct | {seq_of_new})
@@ -0,0 +1,212 @@
+import os
+import sys
+import stat
+import socket
+import asyncio
+import threading
+from queue import Queue
+from time import time, sleep
+from stream import Stream, Vocabulary
+
+class LiveStream(Stream):
+    '''
+    An edge stream that is read from a live source as it is produced, instead of from ../data/.
+
+    Sources:
+    1) 'stdin' (or '-'): the standard input.
+    2) 'fifo:{path}' (or the path of an existing named pipe): a named pipe.
+    3) 'tcp:{host}:{port}': a TCP server that a producer connects to (port 0 picks a free port, see address).
+    4) 'unix:{path}': a Unix socket server that a producer connects to.
+
+    Lines are read by an asyncio event loop in a background thread and handed to the miner in chunks through a bounded queue.
+    When the queue is full, the loop stops reading, so a fast producer is throttled by the socket or pipe (backpressure).
+    The stream ends when the producer closes its end. Lines are in the edgelist format (see Stream).
+    '''
+    def __init__(self, source, name='live', delimiter=',', intern=False, max_chunks=64, report_every=None):
+        '''
+        :source: where to read the stream from (see above).
+        :name: the name of the stream, used for the output files.
+        :delimiter: the delimiter of the lines.
+        :intern: if True, then output interned updates (see Stream.encode()).
+        :max_chunks: the maximum number of chunks of updates read ahead of the miner.
+        :report_every: if given, then print the throughput and lag (see report()) every this many seconds.
+        '''
+        self.source = source
+        self.name = name
+        self.delimiter = delimiter
+        self.binary = False
+        self.intern = intern
+        self.start = None
+        self.end = None
+        self.nodes = Vocabulary()
+        self.labels = Vocabulary()
+        self.edge_labels = Vocabulary()
+        self.report_every = report_every
+
+        self.chunks = Queue(maxsize=max_chunks)
+        # metrics
+        self.num_received = 0
+        self.num_consumed = 0
+        self.last_time = None
+        self.started = None
+
+        self.address = None
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        # wait until the source is open, so that address is known
+        self.ready.wait()
+        if isinstance(self.address, Exception):
+            raise self.address
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except Exception as e:
+            self.chunks.put(e)
+            if not self.ready.is_set():
+                self.address = e
+                self.ready.set()
+
+    async def serve(self):
+        '''
+        Opens the source and reads it until the producer closes its end.
+        '''
+        loop = asyncio.get_running_loop()
+        kind, _, location = self.source.partition(':')
+        if self.source in ('stdin', '-') or (kind not in ('fifo', 'tcp', 'unix') and stat.S_ISFIFO(os.stat(self.source).st_mode)):
+            kind, location = ('stdin', None) if self.source in ('stdin', '-') else ('fifo', self.source)
+        if kind in ('stdin', 'fifo'):
+            self.ready.set()
+            pipe = sys.stdin.buffer if kind == 'stdin' else open(location, 'rb')
+            if stat.S_ISREG(os.fstat(pipe.fileno()).st_mode):
+                # e.g., stdin redirected from a file, which the event loop cannot watch
+                await self.consume(FileReader(pipe))
+                return
+            reader = asyncio.StreamReader()
+            transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+            try:
+                await self.consume(reader)
+            finally:
+                transport.close()
+        elif kind in ('tcp', 'unix'):
+            connected = asyncio.Event()
+            done = asyncio.Event()
+
+            async def handle(reader, writer):
+                # only one producer is read
+                if connected.is_set():
+                    writer.close()
+                    return
+                connected.set()
+                try:
+                    await self.consume(reader)
+                finally:
+                    writer.close()
+                    done.set()
+
+            if kind == 'tcp':
+                host, port = location.rsplit(':', 1)
+                server = await asyncio.start_server(handle, host, int(port))
+            else:
+                server = await asyncio.start_unix_server(handle, location)
+            self.address = server.sockets[0].getsockname()
+            self.ready.set()
+            async with server:
+                await done.wait()
+        else:
+            raise ValueError('Unknown source {}.'.format(self.source))
+
+    async def consume(self, reader, read_size=1 << 16):
+        '''
+        Parses what is available from the reader into chunks of updates and puts them into the queue, followed by None.
+        Waiting on a full queue stops the reading, which is what throttles the producer.
+        '''
+        loop = asyncio.get_running_loop()
+        rest = b''
+        while True:
+            data = await reader.read(read_size)
+            if not data:
+                break
+            data = rest + data
+            end = data.rfind(b'\n') + 1
+            rest = data[end:]
+            lines = data[:end].decode().split('\n')
+            lines.pop()
+            if lines:
+                await loop.run_in_executor(None, self.chunks.put, self.parse(lines))
+        if rest.strip():
+            await loop.run_in_executor(None, self.chunks.put, self.parse([rest.decode()]))
+        await loop.run_in_executor(None, self.chunks.put, None)
+
+    def parse(self, lines):
+        updates = [line.strip().split(self.delimiter) for line in lines if line.strip()]
+        if self.intern:
+            updates = [self.encode(update) for update in updates]
+        self.num_received += len(updates)
+        return updates
+
+    def flow(self):
+        '''
+        Output the updates as they arrive.
+        '''
+        self.started = time()
+        last_report = self.started
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                break
+            if isinstance(chunk, Exception):
+                raise chunk
+            for update in chunk:
+                yield update
+            self.num_consumed += len(chunk)
+            self.last_time = int(chunk[-1][-1]) if chunk else self.last_time
+            if self.report_every is not None and time() - last_report >= self.report_every:
+                last_report = time()
+                print(self.report())
+
+    def report(self):
+        '''
+        :return: the throughput, the backlog of updates read but not yet mined, and the lag of the last mined update
+        behind the wall clock (meaningful if timestamps are in seconds since the epoch).
+        '''
+        if self.started is None:
+            return ''
+        elapsed = max(time() - self.started, 1e-9)
+        lag = 'n/a' if self.last_time is None else '{:.1f} s'.format(time() - self.last_time)
+        return 'Live stream: {} updates, {:.1f} updates / sec, backlog of {} updates ({} / {} chunks), lag {}.'.format(
+            self.num_consumed, self.num_consumed / elapsed, self.num_received - self.num_consumed, self.chunks.qsize(), self.chunks.maxsize, lag)
+
+class FileReader:
+    '''
+    Reads a regular file with the interface of asyncio.StreamReader.read(), in the event loop's executor.
+    '''
+    def __init__(self, f):
+        self.f = f
+
+    async def read(self, n):
+        return await asyncio.get_running_loop().run_in_executor(None, self.f.read1, n)
+
+def produce(address, path, rate=None, family=socket.AF_INET):
+    '''
+    A test producer: sends the lines of an edgelist to a LiveStream socket.
+
+    :address: the address of the LiveStream (e.g., LiveStream.address).
+    :path: the path of the edgelist to send.
+    :rate: if given, then the number of lines to send per second.
+    :family: socket.AF_INET for 'tcp:' sources and socket.AF_UNIX for 'unix:' sources.
+    '''
+    with socket.socket(family, socket.SOCK_STREAM) as s:
+        s.connect(address)
+        with open(path, 'rb') as f:
+            for line in f:
+                s.sendall(line)
+                if rate:
+                    sleep(1 / rate)
+
+if __name__ == '__main__':
+    # e.g., python live_stream.py localhost 9999 ../data/reddit.txt 1000
+    host, port, path = sys.argv[1], int(sys.argv[2]), sys.argv[3]
+    rate = float(sys.argv[4]) if len(sys.argv) > 4 else None
+    produce((host, port), path, rate=rate)
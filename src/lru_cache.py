@@ -0,0 +1,48 @@
+from collections import OrderedDict
+
+class LRUCache:
+    '''
+    A dict of at most maxsize items that evicts the least recently used item when it is full, and counts its hits and misses.
+    '''
+    def __init__(self, maxsize):
+        '''
+        :maxsize: the maximum number of items to keep.
+        '''
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        '''
+        :return: the value of key (which becomes the most recently used), or default if it is not cached.
+        '''
+        value = self.data.get(key, self)
+        if value is self:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.data.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def report(self):
+        '''
+        :return: the number of cached items, and the hit rate.
+        '''
+        lookups = self.hits + self.misses
+        return '{} / {} items, {:.1%} hits of {} lookups'.format(len(self), self.maxsize, self.hits / lookups if lookups else 0, lookups)
@@ -3,8 +3,14 @@ from oPENminer import oPENminer
 from sPENminer_anomaly import sPENminerAnomaly
 from method_data_stream import MethodDataStream
 from stream import Stream
+from live_stream import LiveStream
+from miner_group import MinerGroup
+from sharded_miner import ShardedMiner
+from exponent_grid import parse_grid
+import checkpoint
 import argparse
 import sys
+import os
 
 def parse_args():
     def str2bool(v):
@@ -18,68 +24,145 @@ def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('--verbose', type=str2bool, default=True, required=False, help="If True, then print on the fly.")
     parser.add_argument('--stream', '-s', type=str, required=True, help="Stream name.")
-    parser.add_argument('--window_size', '-ws', type=int, default=1, required=False, help="Window size; equivalent to max duration (\delta_max).")
+    parser.add_argument('--source', '-source', type=str, default=None, required=False, help="If given, then mine a live stream from this source (stdin, fifo:{path}, tcp:{host}:{port}, or unix:{path}) with sPENminer.")
+    parser.add_argument('--report_every', '-re', type=float, default=10, required=False, help="How often to report the throughput and lag of a live stream, in seconds.")
+    parser.add_argument('--window_size', '-ws', type=str, default='1', required=False, help="Window size; equivalent to max duration (\delta_max); several comma-separated window sizes (e.g., 10,100,1000) are mined in one pass.")
     parser.add_argument('--max_size', '-ms', type=int, default=1, required=False, help="Max snippet size (k_max).")
-    parser.add_argument('--view', '-v', type=str, default='id', required=False, help="What view of nodes to use.")
-    parser.add_argument('--alpha', '-alpha', type=float, default=1, required=False, help="What exponent to use for W().")
-    parser.add_argument('--beta', '-beta', type=float, default=1, required=False, help="What exponent to use for F().")
-    parser.add_argument('--gamma', '-gamma', type=float, default=1, required=False, help="What exponent to use for S().")
+    parser.add_argument('--budget', '-budget', type=int, default=None, required=False, help="If given, then sample at most this many compatible updates to expand into snippets per update, reweighting the frequencies.")
+    parser.add_argument('--capacity', '-capacity', type=int, default=None, required=False, help="If given, then sPENminer tracks at most this many snippets, evicting the least persistent into a Count-Min sketch.")
+    parser.add_argument('--epsilon', '-epsilon', type=float, default=1e-4, required=False, help="The error of the Count-Min sketch, relative to the total frequency of the evicted snippets.")
+    parser.add_argument('--batch_timestamps', '-bt', type=str2bool, default=False, required=False, help="If True, then sPENminer adds the occurrences of all the updates with the same timestamp to its stats at once, when the timestamp advances.")
+    parser.add_argument('--view', '-v', type=str, default='id', required=False, help="What view of nodes to use; several comma-separated views (e.g., id,label,order) are mined in one pass.")
+    parser.add_argument('--alpha', '-alpha', type=str, default=None, required=False, help="What exponent to use for W(); several comma-separated exponents (e.g., 0.5,1,2) are scored from one pass, in all combinations with beta and gamma.")
+    parser.add_argument('--beta', '-beta', type=str, default=None, required=False, help="What exponent to use for F(); several are comma-separated.")
+    parser.add_argument('--gamma', '-gamma', type=str, default=None, required=False, help="What exponent to use for S(); several are comma-separated.")
     parser.add_argument('--data_stream', '-data_stream', type=str2bool, default=False, required=False, help="Use data stream baseline.")
     parser.add_argument('--freq', '-freq', type=str2bool, default=False, required=False, help="Use frequency baseline (anomaly detection only).")
     parser.add_argument('--delimiter', '-d', type=str, default=',', required=False, help="Delimiter.")
+    parser.add_argument('--binary', '-b', type=str2bool, default=False, required=False, help="If True, then read the stream from its columnar binary version (converted on first use).")
+    parser.add_argument('--intern', '-intern', type=str2bool, default=False, required=False, help="If True, then encode node ids and labels as integers while mining.")
+    parser.add_argument('--start', '-start', type=int, default=None, required=False, help="If given, then only mine the updates with timestamps >= start.")
+    parser.add_argument('--end', '-end', type=int, default=None, required=False, help="If given, then only mine the updates with timestamps <= end.")
     parser.add_argument('--offline', '-o', type=str2bool, default=False, required=False, help="If True, then run offline version.")
     parser.add_argument('--anomaly', '-a', type=str2bool, default=False, required=False, help="If True, then run anomaly version.")
     parser.add_argument('--num_trees', '-num_trees', type=int, default=10, required=False, help="Number of trees for anomaly detection.")
     parser.add_argument('--max_depth', '-max_depth', type=int, default=256, required=False, help="Max depth of trees for anomaly detection.")
     parser.add_argument('--seed', '-seed', type=int, default=0, required=False, help="Seed for random cut forests.")
+    parser.add_argument('--workers', '-workers', type=int, default=1, required=False, help="If more than 1, then sPENminer mines consecutive time ranges of the stream in this many worker processes, and merges their statistics.")
+    parser.add_argument('--checkpoint', '-ckpt', type=str, default=None, required=False, help="If given, then periodically save the state of sPENminer to this path.")
+    parser.add_argument('--checkpoint_every', '-ckpt_every', type=int, default=1 << 20, required=False, help="How many updates to mine between checkpoints.")
+    parser.add_argument('--resume', '-resume', type=str2bool, default=False, required=False, help="If True, then resume mining from the checkpoint (if it exists).")
+    parser.add_argument('--top_report', '-tr', type=str, default=None, required=False, help="If given, then periodically append the top-k snippets of sPENminer and summary counters to this path, as JSON lines.")
+    parser.add_argument('--top_every', '-te', type=int, default=1000, required=False, help="How much progress to mine between top-k reports, in --top_unit.")
+    parser.add_argument('--top_unit', '-tu', type=str, default='time', choices=['time', 'updates'], required=False, help="The unit of --top_every: stream time or updates.")
+    parser.add_argument('--top_k', '-tk', type=int, default=10, required=False, help="How many snippets to report in each top-k report.")
     parser.add_argument('--save_output', '-save', type=str2bool, default=True, required=False, help="If True, then save persistence scores.")
     parser.add_argument('--save_occs', '-so', type=str2bool, default=False, required=False, help="If True, then save occurrences (offline version only).")
     return parser.parse_args()
 
-def main(args):
-    stream = Stream(args.stream, delimiter=args.delimiter)
-    print('Using view \"{}\"'.format(args.view))
+def build_method(args, stream, view, window_size):
+    '''
+    :return: the miner chosen by the arguments, for one of the views and window sizes.
+    '''
     if args.anomaly:
-        method = sPENminerAnomaly(stream,
-                                  window_size=args.window_size,
-                                  max_size=args.max_size,
-                                  view=args.view,
-                                  alpha=args.alpha,
-                                  beta=args.beta,
-                                  gamma=args.gamma,
-                                  data_stream=args.data_stream,
-                                  freq=args.freq,
-                                  num_trees=args.num_trees,
-                                  max_depth=args.max_depth,
-                                  seed=args.seed)
+        return sPENminerAnomaly(stream,
+                                window_size=window_size,
+                                max_size=args.max_size,
+                                view=view,
+                                alpha=args.alpha,
+                                beta=args.beta,
+                                gamma=args.gamma,
+                                data_stream=args.data_stream,
+                                freq=args.freq,
+                                num_trees=args.num_trees,
+                                max_depth=args.max_depth,
+                                seed=args.seed,
+                                budget=args.budget)
     elif args.data_stream:
-        method = MethodDataStream(stream,
-                                  window_size=args.window_size,
-                                  max_size=args.max_size,
-                                  view=args.view,
-                                  save_output=args.save_output)
+        return MethodDataStream(stream,
+                                window_size=window_size,
+                                max_size=args.max_size,
+                                view=view,
+                                save_output=args.save_output,
+                                budget=args.budget)
     elif not args.offline:
-        if args.save_occs:
-            print('\'save_occs = True\' is only an option for offline verions. Occurrences will not be saved')
-        method = sPENminer(stream,
-                           window_size=args.window_size,
-                           max_size=args.max_size,
-                           view=args.view,
-                           alpha=args.alpha,
-                           beta=args.beta,
-                           gamma=args.gamma,
-                           save_output=args.save_output)
+        return sPENminer(stream,
+                         window_size=window_size,
+                         max_size=args.max_size,
+                         view=view,
+                         alpha=args.alpha,
+                         beta=args.beta,
+                         gamma=args.gamma,
+                         save_output=args.save_output,
+                         budget=args.budget,
+                         capacity=args.capacity,
+                         epsilon=args.epsilon,
+                         grid=args.grid,
+                         batch_timestamps=args.batch_timestamps)
     else:
-        method = oPENminer(stream,
-                           window_size=args.window_size,
-                           max_size=args.max_size,
-                           view=args.view,
-                           alpha=args.alpha,
-                           beta=args.beta,
-                           gamma=args.gamma,
-                           save_output=args.save_output,
-                           save_occs=args.save_occs)
-    method.mine(verbose=args.verbose)
+        return oPENminer(stream,
+                         window_size=window_size,
+                         max_size=args.max_size,
+                         view=view,
+                         alpha=args.alpha,
+                         beta=args.beta,
+                         gamma=args.gamma,
+                         save_output=args.save_output,
+                         save_occs=args.save_occs,
+                         budget=args.budget,
+                         grid=args.grid)
+
+def main(args):
+    if args.source:
+        if args.offline or args.data_stream:
+            print('Live sources are mined with the online method (sPENminer).')
+            args.offline = args.data_stream = False
+        stream = LiveStream(args.source, name=args.stream, delimiter=args.delimiter, intern=args.intern, report_every=args.report_every if args.verbose else None)
+        if stream.address:
+            print('Listening on {}'.format(stream.address))
+    else:
+        stream = Stream(args.stream, delimiter=args.delimiter, binary=args.binary, intern=args.intern, start=args.start, end=args.end)
+    if args.save_occs and not (args.anomaly or args.data_stream or args.offline):
+        print('\'save_occs = True\' is only an option for offline verions. Occurrences will not be saved')
+    # the first combination of exponents is the main one, and the others are saved from the same pass
+    exponents = parse_grid(args.alpha, args.beta, args.gamma)
+    if len(exponents) > 1 and (args.anomaly or args.data_stream):
+        raise ValueError('Lists of exponents are only mined by sPENminer and oPENminer, not by the anomaly or data stream methods.')
+    args.alpha, args.beta, args.gamma = exponents[0]
+    args.grid = exponents if len(exponents) > 1 else None
+    views = args.view.split(',')
+    window_sizes = [int(window_size) for window_size in args.window_size.split(',')]
+    miners = list()
+    for view in views:
+        print('Using view \"{}\"'.format(view))
+        for window_size in window_sizes:
+            miners.append(build_method(args, stream, view, window_size))
+    method = miners[0] if len(miners) == 1 else MinerGroup(miners)
+    if args.workers > 1:
+        if type(method) is sPENminer and not args.capacity and not args.source:
+            method = ShardedMiner(method, num_workers=args.workers)
+        else:
+            print('Only sPENminer (with one view and window size, no capacity, and no live source) runs with workers.')
+    if type(method) is not sPENminer:
+        if args.checkpoint:
+            print('Checkpoints are only saved by sPENminer, with one view and window size.')
+        if args.top_report:
+            print('Top-k reports are only written by sPENminer, with one view and window size.')
+        method.mine(verbose=args.verbose)
+        return
+    if args.checkpoint and args.resume:
+        if args.source:
+            print('Live sources cannot be resumed from a checkpoint.')
+        elif os.path.exists(args.checkpoint):
+            method = checkpoint.load(args.checkpoint, stream, method)
+            print('Resuming from {} after {} updates.'.format(args.checkpoint, method.num_updates))
+    method.mine(verbose=args.verbose,
+                checkpoint_path=args.checkpoint,
+                checkpoint_every=args.checkpoint_every,
+                report_path=args.top_report,
+                report_every=args.top_every,
+                report_unit=args.top_unit,
+                report_k=args.top_k)
 
 if __name__ == "__main__":
     args = parse_args()
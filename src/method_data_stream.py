@@ -1,10 +1,10 @@
 from collections import defaultdict
 from stream import Stream
 from extractor import Extractor
-from time import time
+from miner import Miner
 import numpy as np
 
-class MethodDataStream:
+class MethodDataStream(Miner):
     '''
     A class to perform the method from "Finding Persistent Items in Data Streams"
     '''
@@ -13,10 +13,12 @@ class MethodDataStream:
                  window_size,
                  max_size,
                  view='id',
-                 save_output=True):
+                 save_output=True,
+                 budget=None):
         '''
         :stream: a Stream object to mine
         :window_size: the size of a window to use—determines the max size of snippets
+        :budget: if given, then the maximum number of compatible updates to expand into snippets per update (see Extractor)
         '''
         self.stream = stream
         self.window_size = window_size
@@ -29,23 +31,19 @@ class MethodDataStream:
 
         self.Ps = dict()
 
+        self.budget = budget
         self.extractor = Extractor(self)
         self.save_output = save_output
 
-    def process_update(self, update):
-        '''
-        Process an update from the stream.
-
-        update_type, u, v, w, l_u, l_v, r = update
-        '''
+    def begin_update(self, update):
         self.time = int(update[-1])
         if self.ts == 0:
             self.ts = self.time
-        self.extractor.extract_sequences(update)
 
-    def book_keeping(self, snippet):
+    def book_keeping(self, snippet, weight=1):
         '''
         :snippet: a snippet to keep the books on.
+        :weight: unused, since persistence here only depends on the bins that the snippet occurs in.
         '''
         self.snippet_to_occs[snippet].append(self.time)
 
@@ -76,17 +74,13 @@ class MethodDataStream:
         Mine the stream.
         '''
         print("Running method from \"Finding Persistent Items in Data Streams.\"")
-        t0 = time()
-        N = 0
-        for update in self.stream.flow():
-            self.process_update(update)
-            N += 1
-            if N > 0 and N % 10000 == 0 and verbose:
-                print('{} edge updates processed.'.format(N))
-        t1 = time()
+        super().mine(verbose)
 
+    def finish(self, verbose=True):
+        '''
+        Computes persistence and saves the output after the stream is mined.
+        '''
         if verbose:
-            print('{} edges / sec'.format(N / (t1 - t0)))
             print('Computing persistence.')
         file_prefix = '{}_window_size_{}_max_size_{}'.format(self.stream.name, self.window_size, self.max_size)
         base_path = '../output/{}/{}/{}'.format('offline', self.view, file_prefix)
@@ -95,8 +89,8 @@ class MethodDataStream:
         if self.save_output:
             if verbose:
                 for P, item in sorted(self.Ps.items(), reverse=True, key=lambda it: it[1])[:10]:
-                    print(P, item)
+                    print(self.stream.decode(P, self.view), item)
                 print('Saving output to {}'.format(base_path))
             with open('{}_data_stream_out.txt'.format(base_path), 'w') as f:
                 for snippet, persistence in sorted(self.Ps.items(), reverse=True, key=lambda it: it[1]):
-                    f.write('{},{}\n'.format(snippet, persistence))
+                    f.write('{},{}\n'.format(self.stream.decode(snippet, self.view), persistence))
@@ -0,0 +1,69 @@
+from time import time
+
+class Miner:
+    '''
+    The loop to mine a stream, shared by the miners (and MinerGroup).
+
+    The snippets of each update are extracted by the miner's Extractor, between begin_update() and end_update(),
+    and the output is saved by finish() after the stream is mined.
+    '''
+    # how many updates to mine between progress messages
+    PROGRESS_EVERY = 10000
+
+    def process_update(self, update):
+        '''
+        Process an update from the stream.
+
+        update_type, u, v, w, l_u, l_v, r, t = update
+        '''
+        self.begin_update(update)
+        self.extractor.extract_sequences(update)
+        self.end_update()
+
+    def begin_update(self, update):
+        '''
+        Prepares to book-keep the snippets of an update (see MinerGroup for extracting them for several miners).
+        '''
+        self.time = int(update[-1])
+
+    def end_update(self):
+        '''
+        Updates the scores of the snippets of an update, after they are book-kept.
+        '''
+        pass
+
+    def print_progress(self, N):
+        print('{} edge updates processed.'.format(N))
+
+    def run(self, verbose=True, callback=None):
+        '''
+        Mine the updates of the stream, without saving the output (see mine()).
+
+        :callback: if given, then a function called after each update.
+
+        :return: the number of updates mined.
+        '''
+        t0 = time()
+        N = 0
+        for update in self.stream.flow():
+            self.process_update(update)
+            N += 1
+            if verbose and N % self.PROGRESS_EVERY == 0:
+                self.print_progress(N)
+            if callback:
+                callback()
+        t1 = time()
+        if verbose:
+            print('{} edges / sec'.format(N / (t1 - t0)))
+            if self.stream.report():
+                print(self.stream.report())
+            if self.max_size > 1:
+                print(self.extractor.report())
+        return N
+
+    def mine(self, verbose=True):
+        '''
+        Mine the stream, then save the output.
+        '''
+        self.run(verbose)
+        self.finish(verbose)
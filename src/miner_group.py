@@ -0,0 +1,46 @@
+from extractor import Extractor
+from miner import Miner
+
+class MinerGroup(Miner):
+    '''
+    A class to mine a stream with several miners (e.g., one per view and window size) in one pass.
+
+    The miners share one Extractor of the largest window, so the window and compatability graph are maintained once per update,
+    and each snippet is book-kept by the miners of each view whose window holds it.
+    '''
+    def __init__(self, miners):
+        '''
+        :miners: miners of the same stream, with the same max_size and budget (e.g., sPENminers with different views and window sizes)
+        '''
+        first = miners[0]
+        for miner in miners:
+            if (miner.stream, miner.max_size, miner.budget) != (first.stream, first.max_size, first.budget):
+                raise ValueError('The miners of a group must have the same stream, max_size, and budget.')
+        self.miners = miners
+        self.stream = first.stream
+        self.window_size = max(miner.window_size for miner in miners)
+        self.max_size = first.max_size
+        self.budget = first.budget
+
+        self.time = 0
+        self.extractor = Extractor(self, sinks=[(miner.view, miner.window_size, miner.book_keeping) for miner in miners])
+        for miner in miners:
+            miner.extractor = self.extractor
+
+    def process_update(self, update):
+        '''
+        Process an update from the stream with all the miners.
+        '''
+        self.time = int(update[-1])
+        for miner in self.miners:
+            miner.begin_update(update)
+        self.extractor.extract_sequences(update)
+        for miner in self.miners:
+            miner.end_update()
+
+    def finish(self, verbose=True):
+        '''
+        Saves the output of each miner after the stream is mined.
+        '''
+        for miner in self.miners:
+            miner.finish(verbose)
@@ -3,11 +3,12 @@ from stream import Stream
 from extractor import Extractor
 from math import log2 as log
 from math import log10
-from time import time
 import numpy as np
 from scipy.stats import entropy as scipy_entropy
+from exponent_grid import persistence_grid
+from miner import Miner
 
-class oPENminer:
+class oPENminer(Miner):
     '''
     A class to perform the method in an offline (non-streaming) fashion.
     '''
@@ -20,10 +21,14 @@ class oPENminer:
                  beta=1,
                  gamma=1,
                  save_output=True,
-                 save_occs=False):
+                 save_occs=False,
+                 budget=None,
+                 grid=None):
         '''
         :stream: a Stream object to mine
         :window_size: the size of a window to use—determines the max size of snippets
+        :budget: if given, then the maximum number of compatible updates to expand into snippets per update (see Extractor)
+        :grid: if given, then a list of more (alpha, beta, gamma) to also save the output for, from the same pass
         '''
         self.stream = stream
         self.window_size = window_size
@@ -32,6 +37,7 @@ class oPENminer:
         self.alpha = alpha
         self.beta = beta
         self.gamma = gamma
+        self.grid = [exponents for exponents in grid if exponents != (alpha, beta, gamma)] if grid else list()
         self.snippet_to_occs = defaultdict(list)
         self.snippet_to_freq = defaultdict(int)
 
@@ -39,29 +45,26 @@ class oPENminer:
         self.ts = -1
 
         self.Ps = dict()
+        # snippet -> (W, F, S), which do not depend on the exponents (only kept for the grid, see save_grid())
+        self.components = dict()
 
+        self.budget = budget
         self.extractor = Extractor(self)
         self.save_output = save_output
         self.save_occs = save_occs
 
-    def process_update(self, update):
-        '''
-        Process an update from the stream.
-
-        update_type, u, v, w, l_u, l_v, r = update
-        '''
+    def begin_update(self, update):
         self.time = int(update[-1])
         if self.ts == -1:
             self.ts = self.time
-        self.extractor.extract_sequences(update)
 
-    def book_keeping(self, snippet):
+    def book_keeping(self, snippet, weight=1):
         '''
         :snippet: a snippet to keep the books on.
+        :weight: the number of occurrences that the snippet counts for (more than one if it was sampled, see Extractor).
         '''
         self.snippet_to_occs[snippet].append(self.time)
-        if self.save_output:
-            self.snippet_to_freq[snippet] += 1
+        self.snippet_to_freq[snippet] += weight
 
     def W(self, occs, interval_width):
         '''
@@ -74,8 +77,8 @@ class oPENminer:
         tl = occs[-1]
         return (tl - tf + 1) / (interval_width + 1)
 
-    def F(self, occs):
-        return log10(len(occs) + 1)
+    def F(self, freq):
+        return log10(freq + 1)
 
     def S(self, occs):
         # discard duplicates
@@ -103,8 +106,10 @@ class oPENminer:
         :interval_width: the width of the interval to compute persistence over.
         '''
         W = self.W(occs, interval_width)
-        F = self.F(occs)
+        F = self.F(self.snippet_to_freq[snippet])
         S = self.S(occs)
+        if self.grid:
+            self.components[snippet] = (W, F, S)
 
         return (W ** self.alpha) * (F ** self.beta) * (S ** self.gamma)
 
@@ -124,7 +129,7 @@ class oPENminer:
             # the snippet's occurrences
             occs = sorted(occs)
             if self.save_occs:
-                f.write('{},{}\n'.format(snippet, ','.join(list(str(it) for it in occs))))
+                f.write('{},{}\n'.format(self.stream.decode(snippet, self.view), ','.join(list(str(it) for it in occs))))
             ''' compute P value '''
             P = self.P(snippet, occs, interval_width)
             self.Ps[snippet] = P
@@ -132,21 +137,11 @@ class oPENminer:
         if self.save_occs:
             f.close()
 
-    def mine(self, verbose=True):
+    def finish(self, verbose=True):
         '''
-        Mine the stream.
+        Computes persistence and saves the output after the stream is mined.
         '''
-        t0 = time()
-        N = 0
-        for update in self.stream.flow():
-            self.process_update(update)
-            N += 1
-            if N > 0 and N % 10000 == 0 and verbose:
-                print('{} edge updates processed.'.format(N))
-        t1 = time()
-
         if verbose:
-            print('{} edges / sec'.format(N / (t1 - t0)))
             print('Computing persistence.')
         file_prefix = '{}_window_size_{}_max_size_{}_exps_{}_{}_{}'.format(self.stream.name, self.window_size, self.max_size, self.alpha, self.beta, self.gamma)
         base_path = '../output/{}/{}/{}'.format('offline', self.view, file_prefix)
@@ -159,11 +154,31 @@ class oPENminer:
         if self.save_output:
             if verbose:
                 for P, item in sorted(self.Ps.items(), reverse=True, key=lambda it: it[1])[:10]:
-                    print(P, item)
+                    print(self.stream.decode(P, self.view), item)
                 print('Saving output to {}'.format(base_path))
             with open('{}_out.txt'.format(base_path), 'w') as f:
                 for snippet, persistence in sorted(self.Ps.items(), reverse=True, key=lambda it: it[1]):
-                    f.write('{},{}\n'.format(snippet, persistence))
+                    f.write('{},{}\n'.format(self.stream.decode(snippet, self.view), persistence))
             with open('{}_freq_out.txt'.format(base_path), 'w') as f:
                 for snippet, persistence in sorted(self.snippet_to_freq.items(), reverse=True, key=lambda it: it[1]):
-                    f.write('{},{}\n'.format(snippet, persistence))
+                    f.write('{},{}\n'.format(self.stream.decode(snippet, self.view), persistence))
+            if self.grid:
+                self.save_grid(verbose)
+
+    def save_grid(self, verbose=True):
+        '''
+        Writes the output for each (alpha, beta, gamma) in the grid, as if from separate runs, from the components of persistence (see persistence_grid()).
+        '''
+        snippets = list(self.components.keys())
+        W, F, S = np.array(list(self.components.values())).T
+        for (alpha, beta, gamma), Ps in zip(self.grid, persistence_grid(W, F, S, self.grid)):
+            file_prefix = '{}_window_size_{}_max_size_{}_exps_{}_{}_{}'.format(self.stream.name, self.window_size, self.max_size, alpha, beta, gamma)
+            base_path = '../output/{}/{}/{}'.format('offline', self.view, file_prefix)
+            if verbose:
+                print('Saving output to {}'.format(base_path))
+            with open('{}_out.txt'.format(base_path), 'w') as f:
+                for snippet, persistence in sorted(zip(snippets, Ps.tolist()), reverse=True, key=lambda it: it[1]):
+                    f.write('{},{}\n'.format(self.stream.decode(snippet, self.view), persistence))
+            with open('{}_freq_out.txt'.format(base_path), 'w') as f:
+                for snippet, freq in sorted(self.snippet_to_freq.items(), reverse=True, key=lambda it: it[1]):
+                    f.write('{},{}\n'.format(self.stream.decode(snippet, self.view), freq))
@@ -1,13 +1,27 @@
-from collections import defaultdict
 from stream import Stream
 from extractor import Extractor
+from snippet_stats import SnippetStats
+from count_min_sketch import CountMinSketch
+from heapq import heapify, heappop, heappush
+import checkpoint
+from exponent_grid import persistence_grid
+import numpy as np
+import json
 from math import log2 as log
 from math import log10
-from time import time
+from miner import Miner
 
-class sPENminer:
+class sPENminer(Miner):
     '''
     A class to perform the method.
+
+    With a capacity, sPENminer runs in bounded memory: it tracks at most capacity snippets, and after each update evicts the snippets
+    with the smallest persistence into a CountMinSketch. When an evicted snippet occurs again, it is tracked again from the bounds
+    in the sketch: its first occurrence is at or before, and its last occurrence and frequency are at or after, the true ones, so its W() and F()
+    (and its persistence, up to the estimate of S()) are overestimated, the frequency by at most epsilon times the total frequency of the evicted snippets
+    with probability at least 1 - delta. Only the snippets in the sketch's filter of evicted snippets are readmitted from their bounds, so snippets
+    that are never evicted (e.g., those that stay among the top capacity snippets) are exact, up to the false positives of the filter.
+    The top-k snippets (for k < capacity) are exact unless they were evicted earlier in the stream.
     '''
     def __init__(self,
                  stream,
@@ -17,11 +31,24 @@ class sPENminer:
                  alpha=1,
                  beta=1,
                  gamma=1,
-                 save_output=True):
+                 save_output=True,
+                 budget=None,
+                 capacity=None,
+                 epsilon=1e-4,
+                 delta=0.01,
+                 grid=None,
+                 batch_timestamps=False):
         '''
         :stream: a Stream object to mine
         :window_size: how much time to allow between the first and last occurrence of snippets
         :max_size: the maximum number of edges to allow in a snippet
+        :budget: if given, then the maximum number of compatible updates to expand into snippets per update (see Extractor)
+        :capacity: if given, then the maximum number of snippets to track, evicting the others into a CountMinSketch
+        :epsilon: the error of the sketch (see CountMinSketch)
+        :delta: the probability that the error of the sketch is larger
+        :grid: if given, then a list of more (alpha, beta, gamma) to also save the output for, from the same pass (see save_grid())
+        :batch_timestamps: if True, then accumulate the occurrences of all the updates with the same timestamp, and add them to the stats
+                           once per snippet when the timestamp advances (see add_occurrences())
         '''
         self.stream = stream
         self.window_size = window_size
@@ -29,22 +56,61 @@ class sPENminer:
         self.alpha = alpha
         self.beta = beta
         self.gamma = gamma
+        self.grid = [exponents for exponents in grid if exponents != (alpha, beta, gamma)] if grid else list()
+        self.batch_timestamps = batch_timestamps
 
         self.time = 0 # time starts at 0, but will be updated _upon_ the arrival of the first update
         self.ts = -1
-        self.new = set()
+        # the number of updates mined by mine()
+        self.num_updates = 0
+        # snippet -> its occurrences in the current update (or timestamp, with batch_timestamps) that are not in the stats yet
+        self.freq_of_current = dict()
 
         # maintain stats for snippets
-        self.first_occs = dict()
-        self.last_occs = dict()
-        self.num_occs = defaultdict(int)
-        self.num_gaps = defaultdict(int)
-        self.old_Ps = dict()
+        self.stats = SnippetStats(weighted=budget is not None)
+        # dict-like views of the stats, keyed by snippets
+        self.first_occs = self.stats.column('first_occs')
+        self.last_occs = self.stats.column('last_occs')
+        self.num_occs = self.stats.column('num_occs', default=0)
+        self.num_gaps = self.stats.column('num_gaps', default=0)
+        # the persistence of each snippet when it last occurred
+        self.old_Ps = self.stats.column('old_Ps', value=self.old_P)
+
+        # lazy max-heap of (-rank, id) of the most persistent snippets, where an entry is stale if the snippet's rank changed (see top)
+        self.top_heap = list()
+        # ids of the snippets that occurred since the last top(), whose ranks are not in top_heap yet
+        self.dirty = set()
+
+        # bounded memory
+        self.capacity = capacity
+        self.sketch = CountMinSketch(epsilon, delta) if capacity else None
+        # lazy min-heap of (rank, id) (see evict)
+        self.heap = list()
 
         self.view = view
+        self.budget = budget
         self.extractor = Extractor(self)
         self.save_output = save_output
 
+    def __getstate__(self):
+        '''
+        The state to pickle in a checkpoint: the stream is reattached when it is loaded, and the heaps are rebuilt.
+        '''
+        state = self.__dict__.copy()
+        state['stream'] = None
+        state['top_heap'] = list()
+        state['dirty'] = set()
+        state['heap'] = list()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.top_heap = [(-self.rank(i), i) for i in self.stats.ids.values()]
+        heapify(self.top_heap)
+        if self.capacity:
+            self.heap = [(self.rank(i), i) for i in self.stats.ids.values()]
+            heapify(self.heap)
+
     def query(self, x):
         '''
         Query the current persistence score of snippet x.
@@ -52,180 +118,365 @@ class sPENminer:
         :x: the snippet whose persistence to return.
         :return: the persistence of x, after recomputing it.
         '''
+        self.add_occurrences()
         return self.P_no_new_occ(x)
 
     def P_no_new_occ(self, x, te=None):
         if te == None:
-            ts = self.ts
             te = self.time
-        # first occurrence
-        tf = self.first_occs[x]
-        # when the last occurrence was
-        tl = self.last_occs[x]
-        # the width of the interval to measure persistence over
-        interval_width = te - ts
-        # the snippet's width
-        W = self.W(tl, tf, interval_width)
-        # get the old persistence score
-        old_P = self.old_Ps[x]
-        # old interval width (assuming it was computed when it occurred)
-        old_interval_width = tl - ts
-        # old width
-        old_W = self.W(tl, tf, old_interval_width)
-        # reverse engineer the persistence
-        remove_W = old_W ** self.alpha
-        new_W = W ** self.alpha
-        return old_P / remove_W * new_W
-
-    def H(self, x, ts, te, tf, tl, old_tl, old_freq_of_current):
-        ''' compute from old P value '''
-        old_P = self.old_Ps[x]
-        old_interval_width = old_tl - ts
-        # what the old coverage was
-        old_W = self.W(old_tl, tf, old_interval_width)
-        # what the old frequency was
-        old_F = old_freq_of_current#self.old_freq_of_current[x]
-        # what the old H was
-        old_num_gaps = self.num_gaps[x]
-        remove_W = old_W ** self.alpha
-        remove_F = log10(old_F + 1) ** self.beta
-        old_H = old_P / (remove_W * remove_F) # divide off old W and F
-        old_H = old_H ** (1 / self.gamma) # remove exponent
-        old_H = (old_H - 1) * log(old_num_gaps) # remove normalizer and +1
-        # what the old normalizing Z _was_
-        old_Z = old_tl - tf
-        gap = tl - old_tl
-        new_Z = old_Z + gap
-
-        num_gaps = old_num_gaps + 1
-
-        try:
-            entropy = old_H + (old_Z / new_Z) * log(new_Z) - log(old_Z) + ((1 / old_Z) - (1 / new_Z)) * (log(old_Z) - old_H) * old_Z - (gap / new_Z) * log(gap / new_Z)
-            entropy /= log(num_gaps)
-        except ValueError as e:
-            print('time: {} x: {}, old_H = {}, old_Z = {}, new_Z = {}, gap = {}, gap/new_Z = {}'.format(self.time, x, old_H, old_Z, new_Z, gap, gap / new_Z))
-            print(e)
-            entropy = 0
-
-        self.num_gaps[x] += 1
-        return entropy
+        return self.persistence(self.stats.ids[x], te)
+
+    def persistence(self, i, te, alpha=None, beta=None, gamma=None):
+        '''
+        Computes the persistence of a snippet from its components, which do not depend on the exponents.
+
+        :i: the id of the snippet in the stats.
+        :te: the ending point of the interval to measure persistence in.
+        :alpha, beta, gamma: the exponents, if not the miner's.
+        '''
+        stats = self.stats
+        W = self.W(stats.last_occs[i], stats.first_occs[i], te - self.ts)
+        F = log10(stats.num_occs[i] + 1)
+        return (W ** (self.alpha if alpha is None else alpha)) * (F ** (self.beta if beta is None else beta)) * (self.S(i) ** (self.gamma if gamma is None else gamma))
+
+    def old_P(self, i):
+        '''
+        :return: the persistence of the snippet with id i when it last occurred.
+        '''
+        return self.persistence(i, self.stats.last_occs[i])
 
     def W(self, tl, tf, interval_width):
         return (tl - tf + 1) / (interval_width + 1)
 
-    def S(self, x, ts, te, tf, tl, old_tl, old_freq_of_current):
-        if tf == tl or tf == old_tl: # first or second occ
-            if tf == old_tl:
-                self.num_gaps[x] = 1
+    def S(self, i):
+        '''
+        Computes the regularity of a snippet from the sufficient statistics of the gaps between its distinct occurrences (i is the snippet's id in the stats).
+        The gaps sum to Z = tl - tf, so the entropy of the gaps (as fractions of Z) is H = log(Z) - sum(gap * log(gap)) / Z, which is normalized by log(num_gaps).
+
+        :return: the normalized entropy + 1, or 1 if the snippet has fewer than two gaps.
+        '''
+        stats = self.stats
+        num_gaps = stats.num_gaps[i]
+        if num_gaps < 2:
             return 1
-        return self.H(x, ts, te, tf, tl, old_tl, old_freq_of_current) + 1
+        Z = stats.last_occs[i] - stats.first_occs[i]
+        # H > 0 for two gaps or more, unless the stats are estimates (see readmit)
+        H = max(log(Z) - stats.gap_logs[i] / Z, 0)
+        return H / log(num_gaps) + 1
 
     def F(self, last_occs, old_freq_of_current):
         freq = old_freq_of_current + last_occs
         return log10(freq + 1)
 
+    def add_occurrence(self, x):
+        '''
+        Adds the occurrences of snippet x in the current update to its stats: its frequency, and the gap since its last occurrence (if it is not at the same time).
+
+        :return: the id of x in the stats.
+        '''
+        stats = self.stats
+        i = stats.ids[x]
+        # what the last occurrence _was_
+        old_tl = stats.last_occs[i]
+        # what the last occurrence _now_ is
+        tl = self.time
+        if tl != old_tl:
+            gap = tl - old_tl
+            stats.gap_logs[i] += gap * log(gap)
+            stats.num_gaps[i] += 1
+            stats.last_occs[i] = tl
+        stats.num_occs[i] += self.freq_of_current[x]
+        self.dirty.add(i)
+        return i
+
     def P(self, x, ts=None, te=None):
         '''
-        Return the persistence score for a snippet.
+        Adds the occurrences of a snippet in the current update, and returns its persistence score.
 
         :x: the snippet to compute the persistence score for
-        :ts: the starting point of the interval to measure persistence in
+        :ts: the starting point of the interval to measure persistence in (the first time of the stream)
         :te: the ending point of the interval to measure persistence in
         '''
         if te == None:
-            ts = self.ts
             te = self.time
-        # what the last occurrence _was_
-        old_tl = self.last_occs[x]
-        # what the last occurrence _now_ is
-        tl = self.time
-        # number of occurrences right now
-        last_occs = self.freq_of_current[x]
-        # if the old last and new old are the same, then just update freq
-        old_freq_of_current = self.old_freq_of_current[x]
-        if tl == old_tl and old_freq_of_current > 0:
-            P = (self.old_Ps[x] / log10(old_freq_of_current + 1) ** self.beta) * (log10(old_freq_of_current + last_occs + 1) ** self.beta)
-        else:
-            # first occurrence
-            tf = self.first_occs[x]
-            # the width of the interval to measure persistence over
-            interval_width = te - ts
-            W = (tl - tf + 1) / (interval_width + 1)#self.W(tl, tf, interval_width)
-            F = log10(old_freq_of_current + last_occs + 1)#self.F(old_freq_of_current, last_occs)
-            S = self.S(x, ts, te, tf, tl, old_tl, old_freq_of_current)
-            P = (W ** self.alpha) * (F ** self.beta) * (S ** self.gamma)
+        return self.persistence(self.add_occurrence(x), te)
 
-        self.old_Ps[x] = P
-        self.last_occs[x] = tl
-        self.num_occs[x] += last_occs
+    def rank(self, i):
+        '''
+        :i: the id of a snippet in the stats.
+        :return: the numerator of the snippet's persistence, which ranks the snippets like their persistence does
+        (all the snippets share the denominator of W(), the width of the interval) and only changes when the snippet occurs.
+        '''
+        stats = self.stats
+        return ((stats.last_occs[i] - stats.first_occs[i] + 1) ** self.alpha) * (log10(stats.num_occs[i] + 1) ** self.beta) * (self.S(i) ** self.gamma)
 
-        return P
+    def top(self, k=10):
+        '''
+        Query the k most persistent snippets.
 
-    def process_update(self, update):
+        The snippets are kept in a heap by rank, which only changes when they occur (so it is pushed again at the next query); as time passes, their persistence decays
+        by the same factor, so the order holds and only the k returned scores are recomputed. The entries of snippets that occurred again
+        (or were evicted) since they were pushed are stale, and are dropped when they reach the top.
+
+        :k: the number of snippets to return.
+        :return: a list of the k most persistent snippets and their current persistence, from the most persistent.
+        '''
+        self.add_occurrences()
+        stats = self.stats
+        heap = self.top_heap
+        # push the ranks of the snippets that occurred since the last query, or rebuild the heap to drop the stale entries
+        if len(heap) + len(self.dirty) > 2 * len(stats) + 64:
+            heap[:] = [(-self.rank(i), i) for i in stats.ids.values()]
+            heapify(heap)
+        else:
+            for i in self.dirty:
+                if stats.snippets[i] is not None:
+                    heappush(heap, (-self.rank(i), i))
+        self.dirty.clear()
+        entries = list()
+        seen = set()
+        while heap and len(entries) < k:
+            entry = heappop(heap)
+            i = entry[1]
+            if stats.snippets[i] is None or i in seen or -entry[0] != self.rank(i):
+                continue
+            seen.add(i)
+            entries.append(entry)
+        for entry in entries:
+            heappush(heap, entry)
+        return [(stats.snippets[i], self.query(stats.snippets[i])) for _, i in entries]
+
+    def evict(self):
+        '''
+        Evicts the snippets with the smallest persistence into the sketch, until at most capacity snippets are tracked.
         '''
-        Process an update from the stream.
+        stats = self.stats
+        heap = self.heap
+        while len(stats) > self.capacity and heap:
+            rank, i = heappop(heap)
+            x = stats.snippets[i]
+            if x is None or self.rank(i) != rank:
+                continue
+            self.sketch.add(x, stats.first_occs[i], stats.last_occs[i], stats.num_occs[i], stats.num_gaps[i], stats.gap_logs[i])
+            stats.remove(x)
+        # drop the stale entries
+        if len(heap) > 2 * self.capacity + 64:
+            heap[:] = [(self.rank(i), i) for i in stats.ids.values()]
+            heapify(heap)
 
-        update_type, u, v, w, l_u, l_v, r, t = update
+    def readmit(self, x):
         '''
-        self.new = set()
+        Tracks an evicted snippet x again, from its bounds in the sketch.
+        '''
+        bounds = self.sketch.estimate(x)
+        if bounds is None:
+            return
+        tf, tl, num_occs, num_gaps, gap_logs = bounds
+        stats = self.stats
+        i = stats.ids[x]
+        stats.first_occs[i] = tf
+        stats.last_occs[i] = tl
+        stats.num_occs[i] = num_occs if stats.num_occs.typecode == 'd' else int(num_occs)
+        # no gaps if the first and last occurrences are the same (then they are exact), and at least one otherwise
+        if tf == tl:
+            stats.num_gaps[i] = 0
+        else:
+            stats.num_gaps[i] = max(num_gaps, 1)
+            stats.gap_logs[i] = gap_logs
+
+    def begin_update(self, update):
+        '''
+        Prepares to book-keep the snippets of an update, after adding the occurrences of the last timestamp if it advances.
+        '''
+        time = int(update[-1])
+        if time != self.time:
+            # the occurrences of the last timestamp are added at the time they occurred
+            self.add_occurrences()
         # update the current time to what the update is
-        self.time = int(update[-1])
+        self.time = time
         if self.ts == -1:
             self.ts = self.time
-        self.old_freq_of_current = dict()
-        self.freq_of_current = dict()
-        self.extractor.extract_sequences(update)
 
-        # update persistence scores
-        seen = set()
-        for snippet in self.new:
-            if snippet in seen:
-                continue
-            seen.add(snippet)
-            P = self.P(snippet)
+    def end_update(self):
+        '''
+        Updates the stats of the snippets of an update, after they are book-kept (unless the occurrences are batched by timestamp).
+        '''
+        if not self.batch_timestamps:
+            self.add_occurrences()
 
-    def book_keeping(self, snippet):
+    def add_occurrences(self):
+        '''
+        Adds the book-kept occurrences to the stats (the persistence scores are computed when queried), and evicts snippets if there is a capacity.
+
+        After the first update with a timestamp, the occurrences of a snippet at the same timestamp only add to its frequency,
+        so adding them all at once, when the timestamp advances, gives the same stats with one update per snippet.
+        (If the occurrences are weighted, then the frequencies are summed in a different order, and if there is a capacity,
+        then snippets are evicted once per timestamp, so these can differ.)
+        '''
+        if not self.freq_of_current:
+            return
+        for snippet in self.freq_of_current:
+            i = self.add_occurrence(snippet)
+            if self.capacity:
+                heappush(self.heap, (self.rank(i), i))
+        self.freq_of_current.clear()
+        if self.capacity:
+            self.evict()
+
+    def book_keeping(self, snippet, weight=1):
         '''
         :snippet: a snippet to keep the books on.
+        :weight: the number of occurrences that the snippet counts for (more than one if it was sampled, see Extractor).
         '''
-        self.new.add(snippet)
+        if snippet in self.freq_of_current:
+            self.freq_of_current[snippet] += weight
+            return
         # check if the there is any estimated first occurrence
-        if snippet not in self.first_occs:
-            self.first_occs[snippet] = self.time
-            self.last_occs[snippet] = self.time
-
-        # temporarilly store what the frequency was
-        if snippet not in self.old_freq_of_current:
-            self.old_freq_of_current[snippet] = self.num_occs[snippet]
-            self.freq_of_current[snippet] = 0
-        self.freq_of_current[snippet] += 1
+        if snippet not in self.stats.ids:
+            self.stats.add(snippet, self.time)
+            if self.sketch is not None:
+                self.readmit(snippet)
+        # the frequency before this update is still in num_occs until end_update()
+        self.freq_of_current[snippet] = weight
 
-    def mine(self, verbose=True):
+    def mine(self, verbose=True, checkpoint_path=None, checkpoint_every=1 << 20, report_path=None, report_every=None, report_unit='time', report_k=10):
         '''
         Mine the stream.
+
+        :checkpoint_path: if given, then save a checkpoint there every checkpoint_every updates (see checkpoint.py).
+        :checkpoint_every: how many updates to mine between checkpoints.
+        :report_path: if given, then append a report of the top report_k snippets there every report_every units of progress, and at the end (see write_report()).
+        :report_every: how much progress to mine between reports, or None to only report at the end.
+        :report_unit: the unit of report_every: 'time' (of the stream, since its first update) or 'updates'.
+        :report_k: the number of snippets to report.
         '''
-        t0 = time()
-        N = 0
-        for update in self.stream.flow():
-            self.process_update(update)
-            N += 1
-            if N > 0 and N % 10000 == 0 and verbose:
-                print('{} edge updates processed.'.format(N))
-        t1 = time()
-        if verbose:
-            print('{} edges / sec'.format(N / (t1 - t0)))
+        if report_unit not in ('time', 'updates'):
+            raise ValueError('report_unit must be \'time\' or \'updates\', not {!r}.'.format(report_unit))
+        report_file = open(report_path, 'a') if report_path else None
+        if report_file and report_every:
+            last_report = self.progress(report_unit) // report_every
+
+        def mined():
+            nonlocal last_report
+            self.num_updates += 1
+            if checkpoint_path and self.num_updates % checkpoint_every == 0:
+                checkpoint.save(self, checkpoint_path)
+            if report_file and report_every and self.progress(report_unit) // report_every > last_report:
+                last_report = self.progress(report_unit) // report_every
+                self.write_report(report_file, report_k)
 
+        self.run(verbose, mined)
+        if report_file:
+            self.write_report(report_file, report_k)
+            report_file.close()
+        self.finish(verbose)
+
+    def progress(self, unit='time'):
+        '''
+        :unit: 'time' or 'updates'.
+        :return: how much of the stream was mined: the time since its first update, or the number of updates.
+        '''
+        if unit == 'updates':
+            return self.num_updates
+        return 0 if self.ts == -1 else self.time - self.ts
+
+    def write_report(self, f, k=10):
+        '''
+        Appends a JSON line with the current time, summary counters, and top-k snippets (from top(), without sorting all the snippets) to f,
+        and flushes it, so that the reports of a continuous stream can be followed while it is mined.
+
+        :f: a file open for appending.
+        :k: the number of snippets to report.
+        '''
+        record = {'time': self.time,
+                  'updates': self.num_updates,
+                  'snippets': len(self.stats)}
+        if self.sketch is not None:
+            record['evictions'] = self.sketch.num_adds
+            record['readmissions'] = self.sketch.num_estimates
+        record['top'] = [[self.stream.decode(snippet, self.view), P] for snippet, P in self.top(k)]
+        f.write(json.dumps(record) + '\n')
+        f.flush()
+
+    def finish(self, verbose=True):
+        '''
+        Saves the output after the stream is mined.
+        '''
+        self.add_occurrences()
         if self.save_output:
-            file_prefix = '{}_window_size_{}_max_size_{}_exps_{}_{}_{}'.format(self.stream.name, self.window_size, self.max_size, self.alpha, self.beta, self.gamma)
-            base_path = '../output/{}/{}/{}'.format('online', self.view, file_prefix)
-            snippets = list(self.num_occs.keys())
+            if verbose and self.sketch is not None:
+                print(self.sketch.report())
+            num_occs = self.stats.num_occs
+            rows = [(x, self.query(x), num_occs[i]) for x, i in self.stats.ids.items()]
+            self.save(rows, self.top(10) if verbose else [], verbose)
+            if self.grid:
+                self.save_grid(verbose)
+
+    def grid_scores(self, exponents):
+        '''
+        Computes the current persistence of all the snippets for several triples of exponents.
+        W(), F(), and S() do not depend on the exponents, so they are computed once, for all the snippets at a time (see persistence_grid()).
+
+        :exponents: a list of (alpha, beta, gamma).
+        :return: the ids of the snippets, and an array of their persistence for each triple of exponents.
+        '''
+        stats = self.stats
+        ids = np.fromiter(stats.ids.values(), dtype=np.int64, count=len(stats))
+        columns = (stats.first_occs, stats.last_occs, stats.num_occs, stats.num_gaps, stats.gap_logs)
+        first_occs, last_occs, num_occs, num_gaps, gap_logs = (np.frombuffer(column, dtype=column.typecode)[ids] for column in columns)
+        Z = last_occs - first_occs
+        W = (Z + 1) / (self.time - self.ts + 1)
+        F = np.log10(num_occs + 1)
+        # as in S()
+        S = np.ones(len(ids))
+        gapped = num_gaps >= 2
+        Z = Z[gapped]
+        S[gapped] += np.maximum(np.log2(Z) - gap_logs[gapped] / Z, 0) / np.log2(num_gaps[gapped])
+        return ids, persistence_grid(W, F, S, exponents)
+
+    def save_grid(self, verbose=True):
+        '''
+        Writes the output for each (alpha, beta, gamma) in the grid, as if from separate runs.
+        '''
+        ids, grid_Ps = self.grid_scores(self.grid)
+        ids = ids.tolist()
+        # the snippets are rendered, and the frequencies (the same for all the exponents) sorted, once
+        names = [self.stream.decode(self.stats.snippets[i], self.view) for i in ids]
+        num_occs = self.stats.num_occs
+        freq_out = ''.join('{},{}\n'.format(names[j], num_occs[i]) for j, i in sorted(enumerate(ids), reverse=True, key=lambda it: num_occs[it[1]]))
+        for exponents, Ps in zip(self.grid, grid_Ps):
+            base_path = self.base_path(exponents)
             if verbose:
-                for snippet in sorted(snippets, reverse=True, key=lambda it: self.query(it))[:10]:
-                    print(snippet, self.query(snippet))
                 print('Saving output to {}'.format(base_path))
             with open('{}_out.txt'.format(base_path), 'w') as f:
-                for snippet in sorted(snippets, reverse=True, key=lambda it: self.query(it)):
-                    f.write('{},{}\n'.format(snippet, self.query(snippet)))
+                f.write(''.join('{},{}\n'.format(names[i], P) for i, P in sorted(enumerate(Ps.tolist()), reverse=True, key=lambda it: it[1])))
             with open('{}_freq_out.txt'.format(base_path), 'w') as f:
-                for snippet in sorted(snippets, reverse=True, key=lambda it: self.num_occs[it]):
-                    f.write('{},{}\n'.format(snippet, self.num_occs[snippet]))
+                f.write(freq_out)
+
+    def base_path(self, exponents=None):
+        '''
+        :exponents: the (alpha, beta, gamma) of the output, if not the miner's.
+        :return: the prefix of the paths of the output files.
+        '''
+        alpha, beta, gamma = exponents if exponents else (self.alpha, self.beta, self.gamma)
+        file_prefix = '{}_window_size_{}_max_size_{}_exps_{}_{}_{}'.format(self.stream.name, self.window_size, self.max_size, alpha, beta, gamma)
+        return '../output/{}/{}/{}'.format('online', self.view, file_prefix)
+
+    def save(self, rows, top, verbose=True):
+        '''
+        Writes the persistence and frequency of the snippets, from the highest.
+
+        :rows: a list of (snippet, persistence, frequency), in the order that the snippets were first seen (which breaks ties).
+        :top: a list of (snippet, persistence) of the most persistent snippets, to print.
+        '''
+        base_path = self.base_path()
+        if verbose:
+            for snippet, P in top:
+                print(self.stream.decode(snippet, self.view), P)
+            print('Saving output to {}'.format(base_path))
+        with open('{}_out.txt'.format(base_path), 'w') as f:
+            for snippet, P, _ in sorted(rows, reverse=True, key=lambda row: row[1]):
+                f.write('{},{}\n'.format(self.stream.decode(snippet, self.view), P))
+        with open('{}_freq_out.txt'.format(base_path), 'w') as f:
+            for snippet, _, freq in sorted(rows, reverse=True, key=lambda row: row[2]):
+                f.write('{},{}\n'.format(self.stream.decode(snippet, self.view), freq))
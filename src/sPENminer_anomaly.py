@@ -4,7 +4,6 @@ from sPENminer import sPENminer
 from extractor import Extractor
 from math import log2 as log
 from math import log10
-from time import time
 import numpy as np
 import sys
 import random
@@ -14,6 +13,8 @@ class sPENminerAnomaly(sPENminer):
     '''
     A class to perform the method.
     '''
+    PROGRESS_EVERY = 1000
+
     def __init__(self,
                  stream,
                  window_size,
@@ -26,10 +27,12 @@ class sPENminerAnomaly(sPENminer):
                  freq=False,
                  num_trees=50,
                  max_depth=256,
-                 seed=None):
+                 seed=None,
+                 budget=None):
         '''
         :stream: a Stream object to mine
         :window_size: the size of a window to use—determines the max size of snippets
+        :budget: if given, then the maximum number of compatible updates to expand into snippets per update (see Extractor)
         '''
         print('Running anomaly version.')
         super().__init__(stream,
@@ -39,7 +42,8 @@ class sPENminerAnomaly(sPENminer):
                          alpha=alpha,
                          beta=beta,
                          gamma=gamma,
-                         save_output=False)
+                         save_output=False,
+                         budget=budget)
 
         # tree parameters for rrcf
         print('Random seed {}.'.format(seed))
@@ -91,7 +95,9 @@ class sPENminerAnomaly(sPENminer):
                 except RecursionError as e:
                     print(snippet in tree.leaves)
             if len(tree.leaves) > self.tree_size:
-                to_delete = np.random.choice(list(tree.leaves.keys()))
+                # snippets are tuples, which np.random.choice() would turn into an array
+                leaves = list(tree.leaves.keys())
+                to_delete = leaves[np.random.randint(len(leaves))]
                 try:
                     tree.forget_point(to_delete)
                 except RecursionError as e:
@@ -104,27 +110,19 @@ class sPENminerAnomaly(sPENminer):
         return avg_codisp
 
 
-    def process_update(self, update):
-        '''
-        Process an update from the stream.
-
-        update_type, u, v, w, l_u, l_v, r = update
-        '''
-        self.new = set()
+    def begin_update(self, update):
         # update the current time to what the update is
         self.time = int(update[-1])
         if self.ts == 0:
             self.ts = self.time
-        self.old_freq_of_current = dict()
         self.freq_of_current = dict()
-        self.extractor.extract_sequences(update)
 
+    def end_update(self):
+        '''
+        Updates the persistence and anomaly scores of the snippets of an update, after they are book-kept.
+        '''
         # update persistence scores
-        seen = set()
-        for snippet in self.new:
-            if snippet in seen:
-                continue
-            seen.add(snippet)
+        for snippet in self.freq_of_current:
             if not self.freq:
                 if not self.data_stream:
                     P = self.P(snippet)
@@ -144,21 +142,13 @@ class sPENminerAnomaly(sPENminer):
             self.score_times.append(self.time)
             self.score_snippets.append(snippet)
 
-    def mine(self, verbose=True):
+    def print_progress(self, N):
+        print(N, np.max(self.anomaly_scores), len(self.forest[0].leaves))
+
+    def finish(self, verbose=True):
         '''
-        Mine the stream.
+        Saves the anomaly scores after the stream is mined.
         '''
-        t0 = time()
-        N = 0
-        for update in self.stream.flow():
-            self.process_update(update)
-            N += 1
-            if N > 0 and N % 1000 == 0 and verbose:
-                print(N, np.max(self.anomaly_scores), len(self.forest[0].leaves))
-        t1 = time()
-        if verbose:
-            print('{} edges / sec'.format(N / (t1 - t0)))
-
         file_prefix = '{}_window_size_{}_max_size_{}_exps_{}_{}_{}_num_trees_{}_max_depth_{}_seed_{}'.format(self.stream.name, self.window_size, self.max_size, self.alpha, self.beta, self.gamma, self.num_trees, self.tree_size, self.seed)
         if self.data_stream:
             file_prefix += '_data_stream'
@@ -167,4 +157,4 @@ class sPENminerAnomaly(sPENminer):
         base_path = '../output/{}/{}/{}'.format('online', self.view, file_prefix)
         np.save('{}_anomaly_scores'.format(base_path), np.asarray(self.anomaly_scores))
         np.save('{}_score_times'.format(base_path), np.asarray(self.score_times))
-        np.save('{}_score_snippets'.format(base_path), np.asarray(self.score_snippets))
+        np.save('{}_score_snippets'.format(base_path), np.asarray([self.stream.decode(snippet, self.view) for snippet in self.score_snippets]))
@@ -0,0 +1,263 @@
+from multiprocessing import Pool
+from stream import Stream, binary_path, DECOMPRESSORS
+from sPENminer import sPENminer
+from math import log2 as log
+from array import array
+from time import time
+import numpy as np
+import os
+
+def discard(snippet, weight=1):
+    '''
+    A book keeping function that drops the snippets (see work()).
+    '''
+
+class RangeMiner(sPENminer):
+    '''
+    A sPENminer that also logs the gap terms it adds to the snippets' stats, in order, so that the gaps of the snippets
+    that occur in earlier ranges too can be summed in the same order as in a serial run (see ShardedMiner.run()).
+    '''
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # the id of the snippet and the gap * log2(gap) of each gap added
+        self.log_ids = array('q')
+        self.log_terms = array('d')
+
+    def add_occurrence(self, x):
+        stats = self.stats
+        i = stats.ids[x]
+        gap = self.time - stats.last_occs[i]
+        if gap:
+            self.log_ids.append(i)
+            self.log_terms.append(gap * log(gap))
+        return super().add_occurrence(x)
+
+def work(args, kwargs, start, end, warm_up):
+    '''
+    Mines the updates of a stream in the time range [start, end], in a worker process (see ShardedMiner).
+
+    The updates in [warm_up, start) only fill the window and compatability graph, so that the snippets of the updates in the range are
+    extracted as in a serial run, but their own snippets (which belong to the previous range) are not book-kept.
+
+    :args: the arguments to open the stream with (see Stream.args).
+    :kwargs: the arguments of the sPENminer that mines the range.
+    :start: the first timestamp of the range, or None from the start of the stream.
+    :end: the last timestamp of the range, or None to the end of the stream.
+    :warm_up: the first timestamp to read, before start (or None to read from start).
+
+    :return: the number of updates in the range, their first and last timestamps, the (snippet, first_occ, last_occ, num_occs, num_gaps, gap_logs)
+    of each snippet, in the order that the snippets were first seen (i.e., by id), and the ids and terms of the gaps, in the order they were added (see RangeMiner).
+    '''
+    stream = Stream(**dict(args, start=start if warm_up is None else warm_up, end=end))
+    miner = RangeMiner(stream, save_output=False, **kwargs)
+    extractor = miner.extractor
+    sinks = extractor.sinks
+    warming_up = warm_up is not None
+    if warming_up:
+        extractor.sinks = [(v, window_size, discard) for v, window_size, _ in sinks]
+        extractor.book_keeping = discard
+    N = 0
+    first = None
+    for update in stream.flow():
+        if warming_up and int(update[-1]) >= start:
+            extractor.sinks = sinks
+            extractor.book_keeping = sinks[0][2]
+            warming_up = False
+        miner.process_update(update)
+        if not warming_up:
+            N += 1
+            if first is None:
+                first = miner.time
+    miner.add_occurrences()
+    stats = miner.stats
+    rows = [(x, stats.first_occs[i], stats.last_occs[i], stats.num_occs[i], stats.num_gaps[i], stats.gap_logs[i]) for x, i in stats.ids.items()]
+    return N, first, miner.time, rows, miner.log_ids, miner.log_terms
+
+def sample_timestamps(stream, edgelist, num_samples):
+    '''
+    Samples the timestamps of an uncompressed edgelist at num_samples evenly spaced byte offsets of its time range
+    (bounded with the timestamp index), by seeking to each offset and reading the next full line.
+
+    :return: the sampled timestamps, in order.
+    '''
+    delimiter = stream.delimiter.encode()
+    timestamps = list()
+    with open(edgelist, 'rb') as f:
+        lo, hi = 0, f.seek(0, os.SEEK_END)
+        if stream.start is not None or stream.end is not None:
+            index = stream.load_index(stream.args['name'], edgelist, stream.args['ext'])
+            if stream.start is not None:
+                entry = int(np.searchsorted(index[:, 0], stream.start, side='right')) - 1
+                if entry >= 0:
+                    lo = int(index[entry, 1])
+            if stream.end is not None:
+                entry = int(np.searchsorted(index[:, 0], stream.end, side='right'))
+                if entry < len(index):
+                    hi = int(index[entry, 1])
+        for k in range(num_samples):
+            offset = lo + (hi - lo) * k // num_samples
+            f.seek(offset)
+            if offset > lo:
+                # the rest of the line the offset is in
+                f.readline()
+            line = f.readline()
+            while line and not line.strip():
+                line = f.readline()
+            if line and f.tell() <= hi:
+                timestamps.append(int(line.rsplit(delimiter, 1)[-1]))
+    return timestamps
+
+def time_blocks(stream, num_blocks):
+    '''
+    Splits the time range of a stream into consecutive ranges of about the same number of updates, without splitting a timestamp.
+    The timestamps are read from the columns of binary streams, sampled at byte offsets of uncompressed edgelists (see sample_timestamps()),
+    and read by a pass over compressed edgelists, which cannot be seeked.
+
+    :return: a list of (start, end) of each range (where None is the start or end of the stream).
+    '''
+    (edgelist, member), _ = binary_path(stream.args['name'], stream.args['ext'])
+    if stream.binary:
+        timestamps = stream.columns['timestamp'][stream.first_row:stream.last_row]
+        samples = [int(timestamps[k * len(timestamps) // num_blocks]) for k in range(num_blocks)] if len(timestamps) else []
+    elif member is None and os.path.splitext(edgelist)[1] not in DECOMPRESSORS:
+        samples = sample_timestamps(stream, edgelist, num_blocks)
+    else:
+        copy = Stream(**dict(stream.args, intern=False))
+        timestamps = np.fromiter((int(update[-1]) for update in copy.flow()), dtype=np.int64)
+        copy.f.close()
+        samples = [int(timestamps[k * len(timestamps) // num_blocks]) for k in range(num_blocks)] if len(timestamps) else []
+    if not samples:
+        return [(stream.start, stream.end)]
+    starts = list()
+    last = samples[0] if stream.start is None else max(samples[0], stream.start)
+    for t in samples[1:]:
+        if t > last and (stream.end is None or t <= stream.end):
+            starts.append(t)
+            last = t
+    starts = [stream.start] + starts
+    ends = [t - 1 for t in starts[1:]] + [stream.end]
+    return list(zip(starts, ends))
+
+class ShardedMiner:
+    '''
+    A class to mine a stream with sPENminer over several processes.
+
+    The stream is split into consecutive time ranges, each of which a worker process reads and mines by itself (see work()),
+    after filling its window with the window_size of time before the range. A snippet's statistics over consecutive ranges merge exactly:
+    its first occurrence is in the first range it occurs in, its last occurrence in the last, and its frequency and gaps add up,
+    with one more gap between its last occurrence in a range and its first occurrence in the next. So the merged statistics,
+    in the order that the snippets were first seen, are those of a serial run, and this process only samples the timestamps,
+    merges the workers' statistics, and saves the output. The gaps' logarithms of a snippet that occurs in an earlier range are
+    summed in the order that they occurred, from the workers' logs of them, so that they add up exactly as in a serial run.
+
+    With a budget, each worker samples with its own random state, so the sampled snippets differ from a serial run.
+    Text streams are mined without interning, since each worker would intern their tokens differently.
+    '''
+    def __init__(self, miner, num_workers=2):
+        '''
+        :miner: a sPENminer whose stream and parameters to use, and that keeps the merged statistics.
+        :num_workers: the number of worker processes (i.e., time ranges).
+        '''
+        if miner.capacity:
+            raise ValueError('Sharded mining does not support a capacity.')
+        if getattr(miner.stream, 'args', None) is None:
+            raise ValueError('Sharded mining needs a stream that each worker can open again (not a live stream).')
+        self.miner = miner
+        self.stream = miner.stream
+        self.window_size = miner.window_size
+        self.max_size = miner.max_size
+        self.num_workers = num_workers
+        if not self.stream.binary:
+            self.stream.intern = False
+
+        self.kwargs = dict(window_size=miner.window_size, max_size=miner.max_size, view=miner.view, alpha=miner.alpha, beta=miner.beta, gamma=miner.gamma, budget=miner.budget, batch_timestamps=miner.batch_timestamps)
+
+    def run(self):
+        '''
+        Mines the time ranges in the workers, and merges their statistics into the miner's.
+
+        :return: the number of updates mined.
+        '''
+        blocks = time_blocks(self.stream, self.num_workers)
+        args = dict(self.stream.args, intern=self.stream.intern)
+        if len(blocks) > 1 and not self.stream.binary:
+            # open a range once first, so that the workers do not build the timestamp index at the same time
+            Stream(**dict(args, start=blocks[1][0])).f.close()
+        tasks = list()
+        for k, (start, end) in enumerate(blocks):
+            warm_up = None
+            if k > 0:
+                warm_up = start - self.window_size
+                if self.stream.start is not None:
+                    warm_up = max(warm_up, self.stream.start)
+            tasks.append((args, self.kwargs, start, end, warm_up))
+        with Pool(self.num_workers) as pool:
+            results = pool.starmap(work, tasks)
+        miner = self.miner
+        stats = miner.stats
+        ids = stats.ids
+        last_occs = stats.last_occs
+        num_occs = stats.num_occs
+        num_gaps = stats.num_gaps
+        gap_logs = stats.gap_logs
+        N = 0
+        for num_updates, first, last, rows, log_ids, log_terms in results:
+            if not num_updates:
+                continue
+            N += num_updates
+            if miner.ts == -1:
+                miner.ts = first
+            miner.time = last
+            # the merged id of each of the range's snippets that occurred in an earlier range (-1 for the others)
+            seen = np.full(len(rows), -1, dtype=np.int64)
+            for j, (x, tf, tl, freq, gaps, logs) in enumerate(rows):
+                i = ids.get(x)
+                if i is None:
+                    # the worker summed its gaps from its first occurrence, as a serial run does
+                    i = stats.add(x, tf)
+                    num_gaps[i] = gaps
+                    gap_logs[i] = logs
+                else:
+                    # the gap between the ranges
+                    gap = tf - last_occs[i]
+                    gap_logs[i] += gap * log(gap)
+                    num_gaps[i] += gaps + 1
+                    seen[j] = i
+                last_occs[i] = tl
+                num_occs[i] += freq
+            # then the gaps in the range, one at a time in order (np.add.at is unbuffered)
+            targets = seen[np.frombuffer(log_ids, dtype=np.int64)]
+            kept = targets >= 0
+            np.add.at(np.frombuffer(gap_logs, dtype=np.float64), targets[kept], np.frombuffer(log_terms, dtype=np.float64)[kept])
+        miner.dirty.update(ids.values())
+        miner.num_updates = N
+        return N
+
+    def gather(self):
+        '''
+        Mines the stream, and merges the workers' statistics.
+
+        :return: a list of (snippet, persistence, frequency), in the order that the snippets were first seen (as in sPENminer.finish()).
+        '''
+        self.run()
+        num_occs = self.miner.stats.num_occs
+        return [(x, self.miner.query(x), num_occs[i]) for x, i in self.miner.stats.ids.items()]
+
+    def top(self, k=10):
+        '''
+        Query the k most persistent snippets, after the stream is mined.
+
+        :return: a list of the k most persistent snippets and their current persistence, from the most persistent.
+        '''
+        return self.miner.top(k)
+
+    def mine(self, verbose=True):
+        '''
+        Mine the stream, then save the merged output.
+        '''
+        t0 = time()
+        N = self.run()
+        t1 = time()
+        if verbose:
+            print('{} edges / sec ({} workers)'.format(N / (t1 - t0), self.num_workers))
+        self.miner.finish(verbose)
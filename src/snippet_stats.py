@@ -0,0 +1,137 @@
+from array import array
+
+class SnippetStats:
+    '''
+    The statistics that sPENminer keeps for each snippet, as a struct of arrays:
+    each snippet gets a dense id, and each statistic is a column (a typed array) indexed by the ids.
+    This costs one dict entry per snippet (its id), instead of one per snippet and statistic, and the statistics are unboxed.
+
+    The columns are also exposed as dict-like views keyed by snippets (see Column), e.g., stats.column('num_occs')[snippet].
+    Removed snippets leave their id free (their snippet is None) for the next snippet that is added.
+    '''
+    def __init__(self, weighted=False):
+        '''
+        :weighted: if True, then occurrences can be fractional (e.g., sampled, see Extractor), so num_occs holds floats.
+        '''
+        # snippet -> id
+        self.ids = dict()
+        # id -> snippet
+        self.snippets = list()
+        # ids of removed snippets
+        self.free = list()
+        self.first_occs = array('q')
+        self.last_occs = array('q')
+        self.num_occs = array('d' if weighted else 'q')
+        self.num_gaps = array('q')
+        # the sum of gap * log2(gap) over the gaps between the snippet's distinct occurrences (see sPENminer.S())
+        self.gap_logs = array('d')
+
+    def add(self, snippet, time):
+        '''
+        Starts tracking a snippet that first occurs at time.
+
+        :return: the snippet's id.
+        '''
+        if self.free:
+            i = self.free.pop()
+            self.ids[snippet] = i
+            self.snippets[i] = snippet
+            self.first_occs[i] = time
+            self.last_occs[i] = time
+            self.num_occs[i] = 0
+            self.num_gaps[i] = 0
+            self.gap_logs[i] = 0
+            return i
+        i = len(self.snippets)
+        self.ids[snippet] = i
+        self.snippets.append(snippet)
+        self.first_occs.append(time)
+        self.last_occs.append(time)
+        self.num_occs.append(0)
+        self.num_gaps.append(0)
+        self.gap_logs.append(0)
+        return i
+
+    def remove(self, snippet):
+        '''
+        Stops tracking a snippet.
+        '''
+        i = self.ids.pop(snippet)
+        self.snippets[i] = None
+        self.free.append(i)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def column(self, name, default=None, value=None):
+        '''
+        :name: the name of a column (e.g., 'num_occs').
+        :default: the value of snippets that are not tracked (None to raise a KeyError instead).
+        :value: if given, then a function of a snippet's id that computes its value (e.g., from several columns), instead of reading the column.
+                Such a view only holds the snippets that occurred (whose num_occs is not 0).
+
+        :return: a dict-like view of the column.
+        '''
+        return Column(self, name, default, value)
+
+class Column:
+    '''
+    A dict-like view of a column of SnippetStats, keyed by snippets.
+    Setting the value of a snippet that is not tracked starts tracking it.
+    '''
+    def __init__(self, stats, name, default=None, value=None):
+        self.stats = stats
+        self.name = name
+        self.default = default
+        self.value = value
+
+    def id_of(self, snippet):
+        i = self.stats.ids.get(snippet)
+        if i is None or (self.value is not None and not self.stats.num_occs[i]):
+            return None
+        return i
+
+    def value_of(self, i):
+        return getattr(self.stats, self.name)[i] if self.value is None else self.value(i)
+
+    def __getitem__(self, snippet):
+        i = self.id_of(snippet)
+        if i is None:
+            if self.default is None:
+                raise KeyError(snippet)
+            return self.default
+        return self.value_of(i)
+
+    def get(self, snippet, default=None):
+        i = self.id_of(snippet)
+        return default if i is None else self.value_of(i)
+
+    def __setitem__(self, snippet, value):
+        if self.value is not None:
+            raise TypeError('{} is computed from the stats, and cannot be set.'.format(self.name))
+        i = self.stats.ids.get(snippet)
+        if i is None:
+            i = self.stats.add(snippet, value if self.name in ('first_occs', 'last_occs') else 0)
+        getattr(self.stats, self.name)[i] = value
+
+    def __contains__(self, snippet):
+        return self.id_of(snippet) is not None
+
+    def keys(self):
+        return [snippet for snippet, _ in self.items()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def values(self):
+        return [value for _, value in self.items()]
+
+    def items(self):
+        stats = self.stats
+        return [(stats.snippets[i], self.value_of(i)) for i in range(len(stats.snippets)) if self.id_of(stats.snippets[i]) is not None]
+
+    def __eq__(self, other):
+        return dict(self.items()) == (dict(other.items()) if isinstance(other, Column) else other)
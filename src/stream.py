@@ -1,32 +1,447 @@
 import os
+import io
+import json
+import gzip
+import bz2
+import lzma
+import zipfile
+import threading
+from queue import Queue
+from itertools import islice
+from array import array
+import numpy as np
+
+# columns of the binary format, in the order of the edgelist format
+COLUMNS = ('op', 'u', 'v', 'w', 'u_label', 'v_label', 'edge_label', 'timestamp')
+
+class Vocabulary:
+    '''
+    A dictionary that maps string tokens to dense integer codes (and back).
+    '''
+    def __init__(self, tokens=None):
+        '''
+        :tokens: a list of tokens whose codes are their positions.
+        '''
+        self.tokens = list(tokens) if tokens else list()
+        self.codes = {token: code for code, token in enumerate(self.tokens)}
+
+    def encode(self, token):
+        '''
+        :token: the token to encode, which gets a new code if it has not been seen.
+
+        :return: the integer code of the token.
+        '''
+        code = self.codes.get(token)
+        if code is None:
+            code = len(self.tokens)
+            self.codes[token] = code
+            self.tokens.append(token)
+        return code
+
+    def decode(self, code):
+        return self.tokens[code]
+
+    def __len__(self):
+        return len(self.tokens)
+
+# the decompressor to use for each compressed extension
+DECOMPRESSORS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+
+def find_edgelist(name, ext='txt'):
+    '''
+    Finds the edgelist ../data/{name}.{ext}, or a compressed version of it:
+    ../data/{name}.{ext}.gz/.bz2/.xz, ../data/{name}.zip, or any zip archive in its directory with a {name}.{ext} member.
+
+    :return: a tuple (path, member), where member is the name of the edgelist in the zip archive at path (None if path is not a zip archive).
+    '''
+    ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+    edgelist = os.path.join(ROOT_DIR, '../data/{}.{}'.format(name, ext))
+    if os.path.exists(edgelist):
+        return edgelist, None
+    for compressed_ext in DECOMPRESSORS:
+        if os.path.exists(edgelist + compressed_ext):
+            return edgelist + compressed_ext, None
+    member = os.path.basename(edgelist)
+    archive = os.path.join(ROOT_DIR, '../data/{}.zip'.format(name))
+    archives = [archive] if os.path.exists(archive) else list()
+    directory = os.path.dirname(edgelist)
+    if os.path.isdir(directory):
+        archives += sorted(os.path.join(directory, it) for it in os.listdir(directory) if it.endswith('.zip'))
+    for archive in archives:
+        with zipfile.ZipFile(archive) as z:
+            names = z.namelist()
+        if member in names:
+            return archive, member
+        # e.g., ../data/{name}.zip with a single (differently named) member
+        if archive.endswith('{}.zip'.format(os.path.basename(name))) and len(names) == 1:
+            return archive, names[0]
+    # not found: let open() raise the error for the uncompressed path
+    return edgelist, None
+
+def open_edgelist(path, member=None, threaded=True):
+    '''
+    Opens an edgelist for reading lines, decompressing it on the fly if it is compressed.
+
+    :path: the path of the edgelist (see find_edgelist()).
+    :member: the name of the edgelist within the zip archive at path.
+    :threaded: if True, then decompress in a background thread, so that decompression overlaps with mining.
+
+    :return: an iterable over the lines of the edgelist that can be closed.
+    '''
+    extension = os.path.splitext(path)[1]
+    if member is None and extension not in DECOMPRESSORS:
+        return open(path, 'r')
+    if member is not None:
+        # the member keeps the archive's file open until it is closed itself
+        with zipfile.ZipFile(path) as archive:
+            raw = archive.open(member)
+    else:
+        raw = DECOMPRESSORS[extension](path, 'rb')
+    if not threaded:
+        return io.TextIOWrapper(raw)
+    return DecompressedFile(raw)
+
+class DecompressedFile:
+    '''
+    Iterates over the lines of a decompressing file object, with the decompression running in a background thread.
+
+    zlib, bz2, and lzma release the GIL while decompressing, so the decompression overlaps with the main thread.
+    '''
+    def __init__(self, raw, chunk_size=1 << 20, max_chunks=16):
+        '''
+        :raw: a binary file object that decompresses on read.
+        :chunk_size: the number of decompressed bytes to read at a time.
+        :max_chunks: the maximum number of chunks to decompress ahead.
+        '''
+        self.raw = raw
+        self.chunk_size = chunk_size
+        self.chunks = Queue(maxsize=max_chunks)
+        self.closed = False
+        self.thread = threading.Thread(target=self.decompress, daemon=True)
+        self.thread.start()
+
+    def decompress(self):
+        '''
+        Puts chunks that end on a line break into the queue, followed by None (or the exception raised).
+        '''
+        try:
+            rest = b''
+            while not self.closed:
+                chunk = self.raw.read(self.chunk_size)
+                if not chunk:
+                    break
+                chunk = rest + chunk
+                end = chunk.rfind(b'\n') + 1
+                rest = chunk[end:]
+                if end:
+                    self.chunks.put(chunk[:end])
+            if rest and not self.closed:
+                self.chunks.put(rest)
+            self.chunks.put(None)
+        except Exception as e:
+            self.chunks.put(e)
+
+    def __iter__(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            lines = chunk.decode().split('\n')
+            if not lines[-1]:
+                lines.pop()
+            yield from lines
+
+    def close(self):
+        self.closed = True
+        # unblock the thread if it is waiting on a full queue
+        while self.thread.is_alive():
+            while not self.chunks.empty():
+                self.chunks.get()
+            self.thread.join(timeout=0.01)
+        self.raw.close()
+
+def index_path(name):
+    '''
+    :return: the path of the timestamp index of ../data/{name}.{ext}, i.e., ../data/{name}.idx.npy
+    '''
+    ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(ROOT_DIR, '../data/{}.idx.npy'.format(name))
+
+def build_index(name, ext='txt', delimiter=',', stride=1 << 16):
+    '''
+    Builds a sparse index from timestamps to byte offsets of the (uncompressed) edgelist ../data/{name}.{ext}.
+
+    Each entry (timestamp, offset) marks the first line with that timestamp, and entries are at least stride bytes apart,
+    so every line before offset has a smaller timestamp.
+
+    :name: the name of the stream to index.
+    :ext: the file extension for the graph files.
+    :delimiter: the delimiter for the graph files.
+    :stride: the minimum number of bytes between entries.
+
+    :return: the index as an array with one row (timestamp, offset) per entry.
+    '''
+    ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+    edgelist = os.path.join(ROOT_DIR, '../data/{}.{}'.format(name, ext))
+    entries = array('q')
+    offset = 0
+    last_entry = -stride
+    last_time = None
+    delimiter = delimiter.encode()
+    with open(edgelist, 'rb') as f:
+        for line in f:
+            if line.strip():
+                time = int(line.rsplit(delimiter, 1)[-1])
+                if time != last_time and offset - last_entry >= stride:
+                    entries.append(time)
+                    entries.append(offset)
+                    last_entry = offset
+                last_time = time
+            offset += len(line)
+    index = np.frombuffer(entries, dtype=np.int64).reshape(-1, 2) if entries else np.zeros((0, 2), dtype=np.int64)
+    np.save(index_path(name), index)
+    return index
+
+def binary_path(name, ext='txt'):
+    '''
+    :return: the location (path, member) of the edgelist (see find_edgelist()) and the path of its binary version ../data/{name}.cols/
+    '''
+    ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+    return find_edgelist(name, ext), os.path.join(ROOT_DIR, '../data/{}.cols'.format(name))
+
+def convert(name, ext='txt', delimiter=','):
+    '''
+    Converts ../data/{name}.{ext} (or a compressed version of it) into a columnar binary format, so that it only has to be parsed once.
+
+    The output directory ../data/{name}.cols/ holds one .npy array per column (see COLUMNS) and vocab.json.
+    Node ids, node labels, edge labels, and weights are stored as int32 codes into the vocabularies in vocab.json,
+    the operation as int8, and the timestamp as int64. Extra columns are dropped.
+    The weights are not used by the miners, so they are kept as tokens, like the labels, and can be anything.
+
+    :name: the name of the stream to convert.
+    :ext: the file extension for the graph files.
+    :delimiter: the delimiter for the graph files.
+
+    :return: the path of the output directory.
+    '''
+    (edgelist, member), out_dir = binary_path(name, ext)
+    nodes, labels, edge_labels, weights = Vocabulary(), Vocabulary(), Vocabulary(), Vocabulary()
+    columns = {'op': array('b'), 'u': array('i'), 'v': array('i'), 'w': array('i'),
+               'u_label': array('i'), 'v_label': array('i'), 'edge_label': array('i'), 'timestamp': array('q')}
+    f = open_edgelist(edgelist, member)
+    try:
+        for line in f:
+            update = line.strip().split(delimiter)
+            columns['op'].append(int(update[0]))
+            columns['u'].append(nodes.encode(update[1]))
+            columns['v'].append(nodes.encode(update[2]))
+            columns['w'].append(weights.encode(update[3]))
+            columns['u_label'].append(labels.encode(update[4]))
+            columns['v_label'].append(labels.encode(update[5]))
+            columns['edge_label'].append(edge_labels.encode(update[6]))
+            columns['timestamp'].append(int(update[-1]))
+    finally:
+        f.close()
+
+    os.makedirs(out_dir, exist_ok=True)
+    for column, values in columns.items():
+        np.save(os.path.join(out_dir, '{}.npy'.format(column)), np.frombuffer(values, dtype=values.typecode) if values else np.zeros(0, dtype=values.typecode))
+    # written last, so that its presence marks a complete conversion
+    with open(os.path.join(out_dir, 'vocab.json'), 'w') as f:
+        json.dump({'nodes': nodes.tokens, 'labels': labels.tokens, 'edge_labels': edge_labels.tokens, 'weights': weights.tokens}, f)
+    return out_dir
 
 class Stream:
     '''
     An edge stream representation that seeks to make the operations needed
     for this method as efficient as possible.
     '''
-    def __init__(self, name, ext='txt', delimiter=','):
+    def __init__(self, name, ext='txt', delimiter=',', binary=False, intern=False, start=None, end=None):
         '''
         :name: the name of the stream to load.
         :ext: the file extension for the graph files.
         :delimiter: the delimiter for the graph files.
+        :binary: if True, then read the columnar binary version of the stream (memory-mapped), converting it first if needed.
+        :intern: if True, then output updates with node ids, node labels, and edge labels encoded as dense integers (see encode() and decode()).
+        :start: if given, then output only the updates with timestamps >= start.
+        :end: if given, then output only the updates with timestamps <= end.
+
+        A time range is found by a binary search of the timestamps of binary streams and by a seek with the timestamp index
+        (see build_index(), built on first use) of uncompressed edgelists. Compressed edgelists are scanned up to the range.
 
         Assumes:
-        1) ../data/{name}.{ext} edgelist.
+        1) ../data/{name}.{ext} edgelist, which may be compressed (see find_edgelist()).
         2) File format: delimiter separated items in order: (operation, u, v, w, u_label, v_label, edge_label)
 
         e.g., ../data/boston_bike.txt
         '''
-        ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
-        edgelist = os.path.join(ROOT_DIR, '../data/{}.{}'.format(name, ext))
+        (edgelist, member), cols_dir = binary_path(name, ext)
+        # the arguments to open the stream again, e.g., in another process (see ShardedMiner)
+        self.args = dict(name=name, ext=ext, delimiter=delimiter, binary=binary, intern=intern, start=start, end=end)
         self.name = name
+        if start is not None or end is not None:
+            # so that the output files of a time range are kept apart
+            self.name = '{}_from_{}_to_{}'.format(name, start, end)
 
         self.delimiter = delimiter
-        self.f = open(edgelist, 'r')
+        self.binary = binary
+        self.intern = intern
+        self.start = start
+        self.end = end
+        # the number of updates to skip (see skip())
+        self.num_skipped = 0
+        if self.binary:
+            vocab_path = os.path.join(cols_dir, 'vocab.json')
+            # (re)convert if there is no complete conversion or the edgelist changed since
+            if not os.path.exists(vocab_path) or (os.path.exists(edgelist) and os.path.getmtime(edgelist) > os.path.getmtime(vocab_path)):
+                convert(name, ext=ext, delimiter=delimiter)
+            with open(vocab_path, 'r') as f:
+                vocab = json.load(f)
+            self.nodes = Vocabulary(vocab['nodes'])
+            self.labels = Vocabulary(vocab['labels'])
+            self.edge_labels = Vocabulary(vocab['edge_labels'])
+            self.weights = vocab['weights']
+            self.columns = {column: np.load(os.path.join(cols_dir, '{}.npy'.format(column)), mmap_mode='r') for column in COLUMNS}
+            # the rows in the time range
+            timestamps = self.columns['timestamp']
+            self.first_row = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+            self.last_row = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, side='right'))
+        else:
+            self.nodes = Vocabulary()
+            self.labels = Vocabulary()
+            self.edge_labels = Vocabulary()
+            self.f = open_edgelist(edgelist, member)
+            if start is not None and member is None and os.path.splitext(edgelist)[1] not in DECOMPRESSORS:
+                index = self.load_index(name, edgelist, ext)
+                entry = int(np.searchsorted(index[:, 0], start, side='right')) - 1
+                if entry >= 0:
+                    self.f.seek(int(index[entry, 1]))
+
+    def load_index(self, name, edgelist, ext):
+        '''
+        :return: the timestamp index of the edgelist, (re)building it if it is missing or older than the edgelist.
+        '''
+        path = index_path(name)
+        if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(edgelist):
+            return np.load(path)
+        return build_index(name, ext=ext, delimiter=self.delimiter)
+
+    def num_updates(self):
+        '''
+        :return: the number of updates in the stream (or its time range), which only binary streams know without reading them.
+        '''
+        if not self.binary:
+            raise TypeError('Only binary streams know their number of updates.')
+        return self.last_row - self.first_row
+
+    def skip(self, n):
+        '''
+        Skips the first n updates of the stream, e.g., that were mined before a checkpoint (see checkpoint.py).
+        Binary streams start n rows later; text streams drop the first n updates unparsed (interned streams need their vocabularies restored).
+        '''
+        if self.binary:
+            self.first_row = min(self.first_row + n, self.last_row)
+        else:
+            self.num_skipped = n
 
     def flow(self):
         '''
         Output the stream of updates.
         '''
-        for line in self.f:
+        if self.binary:
+            yield from self.flow_binary()
+            return
+        if self.start is not None or self.end is not None:
+            yield from islice(self.read_range(), self.num_skipped, None)
+            return
+        lines = islice(self.f, self.num_skipped, None) if self.num_skipped else self.f
+        if self.intern:
+            for line in lines:
+                yield self.encode(line.strip().split(self.delimiter))
+            return
+        for line in lines:
             yield line.strip().split(self.delimiter)
+
+    def read_range(self):
+        '''
+        Parse the updates of the edgelist in the time range [start, end], from where the index seeked to.
+        '''
+        start = self.start
+        end = self.end
+        for line in self.f:
+            update = line.strip().split(self.delimiter)
+            time = int(update[-1])
+            if start is not None and time < start:
+                continue
+            if end is not None and time > end:
+                return
+            yield self.encode(update) if self.intern else update
+
+    def report(self):
+        '''
+        :return: a summary of how the stream was read (empty if there is nothing to report, see LiveStream.report()).
+        '''
+        return ''
+
+    def encode(self, update):
+        '''
+        Interns an update: node ids, node labels, and edge labels are mapped to dense integer codes
+        (u and v share codes, as do u_label and v_label), and the operation and timestamp to ints. The weight is kept as it is.
+
+        :update: a tokenized line of the edgelist.
+
+        :return: the update as a tuple (operation, u, v, w, u_label, v_label, edge_label, timestamp).
+        '''
+        nodes = self.nodes.encode
+        labels = self.labels.encode
+        return (int(update[0]), nodes(update[1]), nodes(update[2]), update[3], labels(update[4]), labels(update[5]), self.edge_labels.encode(update[6]), int(update[-1]))
+
+    def decode(self, snippet, view):
+        '''
+        Renders a snippet as a string with the tokens of the edgelist, translating interned codes back.
+
+        :snippet: a snippet built by the Extractor, i.e., a flat tuple (op, u, v, r) * size, e.g., (1, 0, 1, 0, 1, 2, 0, 0).
+        :view: the view that the snippet was built with (its node positions are node ids for 'id', node labels for 'label', and relabelings for 'order').
+
+        :return: the snippet as a string, e.g., '1_1_2_x|1_3_1_x'.
+        '''
+        nodes = self.nodes.tokens if view == 'id' else self.labels.tokens if view == 'label' else None
+        edge_labels = self.edge_labels.tokens
+        decoded = list()
+        for i in range(0, len(snippet), 4):
+            op, u, v, r = snippet[i:i + 4]
+            if self.intern:
+                if nodes is not None:
+                    u = nodes[u]
+                    v = nodes[v]
+                r = edge_labels[r]
+            decoded.append('{}_{}_{}_{}'.format(op, u, v, r))
+        return '|'.join(decoded)
+
+    def flow_binary(self, chunk_size=65536):
+        '''
+        Output the stream of updates from the binary columns, without re-tokenizing.
+
+        Updates are tuples (operation, u, v, w, u_label, v_label, edge_label, timestamp), with int operations and timestamps.
+        If the stream is interned, then the stored codes are output as they are (except the weights, which are always tokens).
+
+        :chunk_size: the number of rows to read from the memory-mapped columns at a time.
+        '''
+        weights = self.weights
+        if self.intern:
+            for start in range(self.first_row, self.last_row, chunk_size):
+                stop = min(start + chunk_size, self.last_row)
+                chunk = [self.columns[column][start:stop].tolist() for column in COLUMNS]
+                chunk[3] = [weights[w] for w in chunk[3]]
+                yield from zip(*chunk)
+            return
+        nodes = self.nodes.tokens
+        labels = self.labels.tokens
+        edge_labels = self.edge_labels.tokens
+        for start in range(self.first_row, self.last_row, chunk_size):
+            stop = min(start + chunk_size, self.last_row)
+            chunk = [self.columns[column][start:stop].tolist() for column in COLUMNS]
+            for op, u, v, w, u_label, v_label, edge_label, timestamp in zip(*chunk):
+                yield (op, nodes[u], nodes[v], weights[w], labels[u_label], labels[v_label], edge_labels[edge_label], timestamp)
@@ -59,8 +59,8 @@ class TestP(unittest.TestCase):
             method_offline.process_update(update)
         method_offline.compute_persistence()
         _P = self.P([1], interval_width=0)
-        assert(_P == method_offline.Ps['1_1_2_1'])
-        assert(_P == method.old_Ps.get('1_1_2_1') == method.query('1_1_2_1'))
+        assert(_P == method_offline.Ps[method.extractor.parse('1_1_2_1')])
+        assert(_P == method.old_Ps.get(method.extractor.parse('1_1_2_1')) == method.query(method.extractor.parse('1_1_2_1')))
 
     def test_P_2(self):
         method = sPENminer(None, window_size=3, max_size=1)
@@ -72,8 +72,8 @@ class TestP(unittest.TestCase):
             method_offline.process_update(update)
         method_offline.compute_persistence()
         _P = self.P([1, 2], interval_width=1)
-        assert(_P == method_offline.Ps['1_1_2_1'])
-        assert(_P == method.old_Ps.get('1_1_2_1') == method.query('1_1_2_1'))
+        assert(_P == method_offline.Ps[method.extractor.parse('1_1_2_1')])
+        assert(_P == method.old_Ps.get(method.extractor.parse('1_1_2_1')) == method.query(method.extractor.parse('1_1_2_1')))
 
     def test_P_3(self):
         method = sPENminer(None, window_size=3, max_size=1)
@@ -85,8 +85,8 @@ class TestP(unittest.TestCase):
             method_offline.process_update(update)
         method_offline.compute_persistence()
         _P = self.P([1, 2, 3], interval_width=2)
-        assert(_P == method_offline.Ps['1_1_2_1'])
-        assert(_P == method.old_Ps.get('1_1_2_1') == method.query('1_1_2_1'))
+        assert(_P == method_offline.Ps[method.extractor.parse('1_1_2_1')])
+        assert(_P == method.old_Ps.get(method.extractor.parse('1_1_2_1')) == method.query(method.extractor.parse('1_1_2_1')))
 
     def test_P_4(self):
         '''
@@ -104,8 +104,8 @@ class TestP(unittest.TestCase):
             method_offline.process_update(update)
         method_offline.compute_persistence()
         _P = self.P([1, 2, 5], interval_width=5-1)
-        assert(_P == method_offline.Ps['1_1_2_1'])
-        assert(_P == method.old_Ps.get('1_1_2_1'))
+        assert(_P == method_offline.Ps[method.extractor.parse('1_1_2_1')])
+        assert(_P == method.old_Ps.get(method.extractor.parse('1_1_2_1')))
 
     def test_P_5(self):
         method = sPENminer(None, window_size=3, max_size=2)
@@ -116,7 +116,7 @@ class TestP(unittest.TestCase):
         for update in updates:
             method.process_update(update)
             method_offline.process_update(update)
-            pattern = method.extractor.singletons[-1][-1]
+            pattern = method.extractor.singletons[-1].snippet
             pattern_to_occs[pattern].append(update[-1])
             assert(abs(method.old_Ps.get(pattern) - method.query(pattern)) < 0.000000001)
         method_offline.compute_persistence()
@@ -133,7 +133,7 @@ class TestP(unittest.TestCase):
         for update in updates:
             method.process_update(update)
             method_offline.process_update(update)
-            pattern = method.extractor.singletons[-1][-1]
+            pattern = method.extractor.singletons[-1].snippet
             pattern_to_occs[pattern].append(update[-1])
             assert(abs(method.old_Ps.get(pattern) - method.query(pattern)) < 0.000000001)
         method_offline.compute_persistence()
@@ -151,7 +151,7 @@ class TestP(unittest.TestCase):
         for update in updates:
             method.process_update(update)
             method_offline.process_update(update)
-            pattern = method.extractor.singletons[-1][-1]
+            pattern = method.extractor.singletons[-1].snippet
             pattern_to_occs[pattern].append(update[-1])
             assert(abs(method.old_Ps.get(pattern) - method.query(pattern)) < 0.000000001)
         method_offline.compute_persistence()
@@ -173,7 +173,7 @@ class TestP(unittest.TestCase):
         for update in updates:
             method.process_update(update)
             method_offline.process_update(update)
-            pattern = method.extractor.singletons[-1][-1]
+            pattern = method.extractor.singletons[-1].snippet
             pattern_to_occs[pattern].append(update[-1])
             assert(abs(method.old_Ps.get(pattern) - method.query(pattern)) < 0.000000001)
         method_offline.compute_persistence()
@@ -195,7 +195,7 @@ class TestP(unittest.TestCase):
         for update in updates:
             method.process_update(update)
             method_offline.process_update(update)
-            pattern = method.extractor.singletons[-1][-1]
+            pattern = method.extractor.singletons[-1].snippet
             pattern_to_occs[pattern].append(update[-1])
             assert(abs(method.old_Ps.get(pattern) - method.query(pattern)) < 0.000000001)
         method_offline.compute_persistence()
@@ -218,7 +218,7 @@ class TestP(unittest.TestCase):
             for update in updates:
                 method.process_update(update)
                 method_offline.process_update(update)
-                pattern = method.extractor.singletons[-1][-1]
+                pattern = method.extractor.singletons[-1].snippet
                 pattern_to_occs[pattern].append(update[-1])
                 assert(abs(method.old_Ps.get(pattern) - method.query(pattern)) < 0.000000001)
             method_offline.compute_persistence()
@@ -241,7 +241,7 @@ class TestP(unittest.TestCase):
             for update in updates:
                 method.process_update(update)
                 method_offline.process_update(update)
-                pattern = method.extractor.singletons[-1][-1]
+                pattern = method.extractor.singletons[-1].snippet
                 pattern_to_occs[pattern].append(update[-1])
                 assert(abs(method.old_Ps.get(pattern) - method.query(pattern)) < 0.000000001)
             method_offline.compute_persistence()
@@ -263,7 +263,7 @@ class TestP(unittest.TestCase):
         for update in updates:
             method.process_update(update)
             method_offline.process_update(update)
-            pattern = method.extractor.singletons[-1][-1]
+            pattern = method.extractor.singletons[-1].snippet
             pattern_to_occs[pattern].append(update[-1])
             assert(abs(method.old_Ps.get(pattern) - method.query(pattern)) < 0.000000001)
         method_offline.compute_persistence()
@@ -285,7 +285,7 @@ class TestP(unittest.TestCase):
         for update in updates:
             method.process_update(update)
             method_offline.process_update(update)
-            pattern = method.extractor.singletons[-1][-1]
+            pattern = method.extractor.singletons[-1].snippet
             pattern_to_occs[pattern].append(update[-1])
             assert(abs(method.old_Ps.get(pattern) - method.query(pattern)) < 0.000000001)
         method_offline.compute_persistence()
@@ -294,6 +294,25 @@ class TestP(unittest.TestCase):
             assert(_P == method_offline.Ps[pattern])
             assert(abs(method_offline.Ps[pattern] - method.query(pattern)) < 0.00000001)
 
+    def test_P_14(self):
+        '''
+        Test that S is computed without drift over many occurrences, from the sufficient statistics of the gaps.
+        '''
+        method = sPENminer(None, window_size=3, max_size=2)
+        random.seed(4)
+        timestamp = 1
+        pattern_to_occs = defaultdict(list)
+        for _ in range(20000):
+            timestamp += random.randint(0, 10)
+            u, v = random.sample('123', 2)
+            update = ('1', u, v, '1', u, v, '1', timestamp)
+            method.process_update(update)
+            pattern_to_occs[method.extractor.singletons[-1].snippet].append(update[-1])
+        for pattern, occs in pattern_to_occs.items():
+            i = method.stats.ids[pattern]
+            assert(method.stats.num_gaps[i] == len(set(occs)) - 1)
+            assert(abs(method.S(i) - self.S(occs)) < 1e-12)
+
 
 if __name__ == "__main__":
     unittest.main()
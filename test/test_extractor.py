@@ -24,10 +24,10 @@ class TestExtractor(unittest.TestCase):
             method.extractor.create_singleton(update)
             if i == 0:
                 assert(len(method.extractor.singletons) == 1)
-                assert(method.extractor.singletons[-1][0] == 1)
+                assert(method.extractor.singletons[-1].age == 1)
             if i == 1:
                 assert(len(method.extractor.singletons) == 2)
-                assert(method.extractor.singletons[-1][0] == 2)
+                assert(method.extractor.singletons[-1].age == 2)
 
     def test_compatability_links_1(self):
         method = sPENminer(None, window_size=3, max_size=3)
@@ -211,9 +211,131 @@ class TestExtractor(unittest.TestCase):
                 assert(set(method.extractor.compatability_links[-1]) == {1, 2})
                 assert(set(method.extractor.compatability_links[-2]) == {1})
                 assert(set(method.extractor.compatability_links[-3]) == set())
-                assert('1_1_2_1|1_3_1_1|1_5_1_1' in method.first_occs)
+                assert(method.extractor.parse('1_1_2_1|1_3_1_1|1_5_1_1') in method.first_occs)
                 assert(len(list(method.first_occs.keys())) == 7)
 
+    def test_create_size_3_snippets_2(self):
+        '''
+        Test that the singletons of the same age are ordered by their snippets as strings (as when snippets were strings), not as tuples.
+        '''
+        # '1_20_3_1' < '1_2_3_1' as strings, but ('1', '2', '3', '1') < ('1', '20', '3', '1')
+        updates = [('1', '2', '3', '1', 'a', 'b', '1', 1), ('1', '20', '3', '1', 'c', 'b', '1', 1), ('1', '3', '4', '1', 'b', 'd', '1', 1)]
+        for max_size in [3, 4]:
+            method = sPENminer(None, window_size=3, max_size=max_size, view='id')
+            for update in updates:
+                method.process_update(update)
+            assert(method.extractor.parse('1_20_3_1|1_2_3_1|1_3_4_1') in method.num_occs)
+            assert(method.extractor.parse('1_2_3_1|1_20_3_1|1_3_4_1') not in method.num_occs)
+
+    def test_node_index_1(self):
+        '''
+        Test that the node index holds exactly the singletons in the window, and that it finds the compatible ones.
+        '''
+        method = sPENminer(None, window_size=2, max_size=2, view='id')
+        # keep the index for any window
+        method.extractor.INDEX_SIZE = 0
+        updates = [('1', '1', '2', '1', '1', '2', '1', 1), ('1', '3', '4', '1', '3', '4', '1', 2), ('1', '2', '3', '1', '2', '3', '1', 3), ('1', '2', '2', '1', '2', '2', '1', 4)]
+        for i, update in enumerate(updates):
+            method.time = update[-1]
+            method.process_update(update)
+            if i == 2:
+                assert(method.extractor.first_seq == 0)
+                assert({node: list(seqs) for node, seqs in method.extractor.node_index.items()} == {'1': [0], '2': [0, 2], '3': [1, 2], '4': [1]})
+            if i == 3:
+                # the first singleton has left the window
+                assert(method.extractor.first_seq == 1)
+                assert(len(method.extractor.singletons) == 3)
+                assert({node: list(seqs) for node, seqs in method.extractor.node_index.items()} == {'2': [2, 3], '3': [1, 2], '4': [1]})
+                assert(method.extractor.compatible_singletons(update) == [method.extractor.singletons[1]])
+        assert(method.num_occs[method.extractor.parse('1_2_3_1|1_2_2_1')] == 1)
+        assert(method.num_occs[method.extractor.parse('1_3_4_1|1_2_3_1')] == 1)
+
+    def test_order_form_1(self):
+        '''
+        Test that order view snippets are relabeled by first appearance, and memoized by their label view snippet.
+        '''
+        method = sPENminer(None, window_size=3, max_size=3, view='order')
+        extractor = method.extractor
+        assert(extractor.order_form(('1', 'a', 'b', '1', '1', 'c', 'a', '1')) == extractor.parse('1_0_1_1|1_2_0_1'))
+        assert(extractor.order_form(('1', 'a', 'a', '1', '-1', 'b', 'a', '1')) == extractor.parse('1_0_0_1|-1_1_0_1'))
+        assert(len(extractor.order_forms) == 2)
+        assert(extractor.order_form(('1', 'a', 'b', '1', '1', 'c', 'a', '1')) is extractor.order_forms[('1', 'a', 'b', '1', '1', 'c', 'a', '1')])
+
+    def test_caches_1(self):
+        '''
+        Test that the extractor's cache stays bounded and counts its hits and misses.
+        '''
+        method = sPENminer(None, window_size=3, max_size=3, view='order')
+        extractor = method.extractor
+        extractor.order_forms.maxsize = 2
+        for labels in [('1', 'a', 'b', '1'), ('1', 'a', 'a', '1'), ('1', 'a', 'b', '1'), ('1', 'c', 'd', '1')]:
+            extractor.order_form(labels)
+        assert(len(extractor.order_forms) == 2)
+        assert(('1', 'a', 'a', '1') not in extractor.order_forms)
+        assert((extractor.order_forms.hits, extractor.order_forms.misses) == (1, 3))
+        assert(list(extractor.all_size_2_subsets([3, 2, 1])) == [(3, 2), (3, 1), (2, 1)])
+        assert(extractor.report().startswith('Extractor caches'))
+
+    def test_create_larger_snippets_1(self):
+        '''
+        Test that every connected snippet with the new update is found once, for k_max > 3.
+        '''
+        method = oPENminer(None, window_size=10, max_size=4, view='id')
+        updates = [('1', '1', '2', '1', '1', '2', '1'), ('1', '1', '3', '1', '1', '3', '1'), ('1', '1', '4', '1', '1', '4', '1'), ('1', '5', '6', '1', '5', '6', '1'), ('1', '1', '5', '1', '1', '5', '1')]
+        for update in updates:
+            method.time += 1
+            method.extractor.extract_sequences(update)
+        size_3 = [snippet for snippet in method.snippet_to_freq if len(snippet) == 12 and snippet[-4:] == updates[-1][:3] + ('1',)]
+        size_4 = [snippet for snippet in method.snippet_to_freq if len(snippet) == 16]
+        assert(len(size_3) == 6)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_2_1|1_5_6_1|1_1_5_1')] == 1)
+        assert(len(size_4) == 4)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_2_1|1_1_3_1|1_5_6_1|1_1_5_1')] == 1)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_2_1|1_1_3_1|1_1_4_1|1_1_5_1')] == 1)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_2_1|1_1_3_1|1_1_4_1')] == 1)
+
+    def test_create_larger_snippets_2(self):
+        '''
+        Test that the size-3 snippets do not depend on k_max, i.e., that they are the same for k_max = 3 and k_max > 3.
+        '''
+        rng = np.random.RandomState(3)
+        updates = [('1', str(u), str(v), '1', str(u % 3), str(v % 3), '1') for u, v in rng.randint(0, 8, (300, 2))]
+        times = np.cumsum(rng.randint(0, 3, len(updates)))
+        for view in ['id', 'label']:
+            size_3 = list()
+            for max_size in [3, 4]:
+                method = oPENminer(None, window_size=4, max_size=max_size, view=view)
+                for t, update in zip(times, updates):
+                    method.time = int(t)
+                    method.extractor.extract_sequences(update)
+                size_3.append({snippet: freq for snippet, freq in method.snippet_to_freq.items() if len(snippet) == 12})
+            assert(size_3[0] == size_3[1])
+
+    def test_budget_1(self):
+        '''
+        Test that a budget bounds the expanded compatability links per update, and that the sampled snippets are reweighted.
+        '''
+        updates = [('1', '1', str(i), '1', 'a', 'b', '1') for i in range(2, 12)]
+        method = oPENminer(None, window_size=10, max_size=3, view='label')
+        budget_method = oPENminer(None, window_size=10, max_size=3, view='label', budget=3)
+        for miner in [method, budget_method]:
+            for update in updates:
+                miner.time += 1
+                num_occs = sum(len(occs) for occs in miner.snippet_to_occs.values())
+                miner.extractor.extract_sequences(update)
+                if miner.extractor.budget:
+                    # the singleton, at most 3 pairs and 3 triples
+                    assert(sum(len(occs) for occs in miner.snippet_to_occs.values()) - num_occs <= 7)
+        pair = method.extractor.parse('1_a_b_1|1_a_b_1')
+        triple = method.extractor.parse('1_a_b_1|1_a_b_1|1_a_b_1')
+        # the weights of the sampled pairs add up to all 45 pairs
+        assert(method.snippet_to_freq[pair] == 45)
+        assert(abs(budget_method.snippet_to_freq[pair] - 45) < 1e-9)
+        assert(len(budget_method.snippet_to_occs[triple]) < 120)
+        assert(budget_method.extractor.num_sampled_updates == 6)
+        assert(budget_method.extractor.num_skipped_links == sum(range(1, 7)))
+        assert('6 updates sampled' in budget_method.extractor.report())
+
     def test_extract_sequences_1(self):
         method = oPENminer(None, window_size=3, max_size=4, view='id')
         updates = [('1', '1', '1', '1', '1', '1', '1')] * 100
@@ -224,9 +346,9 @@ class TestExtractor(unittest.TestCase):
             method.extractor.extract_sequences(update)
         assert(len(method.extractor.singletons) == 4)
 
-        assert(method.snippet_to_freq['1_1_1_1'] == 100)
-        assert(method.snippet_to_freq['1_1_1_1|1_1_1_1'] == 294)
-        assert(method.snippet_to_freq['1_1_1_1|1_1_1_1|1_1_1_1'] == 292)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_1_1')] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_1_1|1_1_1_1')] == 294)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_1_1|1_1_1_1|1_1_1_1')] == 292)
 
     def test_extract_sequences_2(self):
         method = oPENminer(None, window_size=3, max_size=3, view='id')
@@ -241,14 +363,14 @@ class TestExtractor(unittest.TestCase):
             method.extractor.extract_sequences(update)
         assert(len(method.extractor.singletons) == 4)
 
-        assert(method.snippet_to_freq['1_1_2_1'] == 100)
-        assert(method.snippet_to_freq['1_3_4_1'] == 100)
-        assert(method.snippet_to_freq['1_1_4_1'] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_2_1')] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_3_4_1')] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_4_1')] == 100)
 
-        assert(method.snippet_to_freq['1_1_2_1|1_3_4_1'] == 0)
-        assert(method.snippet_to_freq['1_1_2_1|1_1_4_1'] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_2_1|1_3_4_1')] == 0)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_2_1|1_1_4_1')] == 100)
 
-        assert(method.snippet_to_freq['1_1_2_1|1_3_4_1|1_1_4_1'] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_2_1|1_3_4_1|1_1_4_1')] == 100)
 
     def test_extract_sequences_3(self):
         method = oPENminer(None, window_size=3, max_size=3, view='id')
@@ -263,16 +385,16 @@ class TestExtractor(unittest.TestCase):
             method.extractor.extract_sequences(update)
         assert(len(method.extractor.singletons) == 4)
 
-        assert(method.snippet_to_freq['1_1_2_1'] == 100)
-        assert(method.snippet_to_freq['1_3_1_1'] == 100)
-        assert(method.snippet_to_freq['1_1_4_1'] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_2_1')] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_3_1_1')] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_4_1')] == 100)
 
-        assert(method.snippet_to_freq['1_1_2_1|1_3_1_1'] == 100)
-        assert(method.snippet_to_freq['1_1_2_1|1_1_4_1'] == 100)
-        assert(method.snippet_to_freq['1_3_1_1|1_1_4_1'] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_2_1|1_3_1_1')] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_2_1|1_1_4_1')] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_3_1_1|1_1_4_1')] == 100)
 
-        assert(method.snippet_to_freq['1_1_2_1|1_3_1_1|1_1_4_1'] == 100)
-        assert(method.snippet_to_freq['1_3_1_1|1_1_4_1|1_1_2_1'] == 99)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_2_1|1_3_1_1|1_1_4_1')] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_3_1_1|1_1_4_1|1_1_2_1')] == 99)
 
     def test_extract_sequences_4(self):
         method = oPENminer(None, window_size=3, max_size=3, view='id')
@@ -287,15 +409,15 @@ class TestExtractor(unittest.TestCase):
             method.extractor.extract_sequences(update)
         assert(len(method.extractor.singletons) == 4)
 
-        assert(method.snippet_to_freq['1_1_2_1'] == 100)
-        assert(method.snippet_to_freq['1_3_1_1'] == 100)
-        assert(method.snippet_to_freq['1_3_4_1'] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_2_1')] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_3_1_1')] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_3_4_1')] == 100)
 
-        assert(method.snippet_to_freq['1_1_2_1|1_3_1_1'] == 100)
-        assert(method.snippet_to_freq['1_3_1_1|1_3_4_1'] == 100)
-        assert(method.snippet_to_freq['1_1_2_1|1_3_4_1'] == 0)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_2_1|1_3_1_1')] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_3_1_1|1_3_4_1')] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_2_1|1_3_4_1')] == 0)
 
-        assert(method.snippet_to_freq['1_1_2_1|1_3_1_1|1_3_4_1'] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_2_1|1_3_1_1|1_3_4_1')] == 100)
 
     def test_extract_sequences_5(self):
         '''
@@ -313,15 +435,15 @@ class TestExtractor(unittest.TestCase):
             method.extractor.extract_sequences(update)
         assert(len(method.extractor.singletons) == 0)
 
-        assert(method.snippet_to_freq['1_1_2_1'] == 100)
-        assert(method.snippet_to_freq['1_3_1_1'] == 100)
-        assert(method.snippet_to_freq['1_3_4_1'] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_2_1')] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_3_1_1')] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_3_4_1')] == 100)
 
-        assert(method.snippet_to_freq['1_1_2_1|1_3_1_1'] == 0)
-        assert(method.snippet_to_freq['1_3_1_1|1_3_4_1'] == 0)
-        assert(method.snippet_to_freq['1_1_2_1|1_3_4_1'] == 0)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_2_1|1_3_1_1')] == 0)
+        assert(method.snippet_to_freq[method.extractor.parse('1_3_1_1|1_3_4_1')] == 0)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_2_1|1_3_4_1')] == 0)
 
-        assert(method.snippet_to_freq['1_1_2_1|1_3_1_1|1_3_4_1'] == 0)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_2_1|1_3_1_1|1_3_4_1')] == 0)
 
     def test_extract_sequences_6(self):
         '''
@@ -339,15 +461,15 @@ class TestExtractor(unittest.TestCase):
             method.extractor.extract_sequences(update)
         assert(len(method.extractor.singletons) == 4)
 
-        assert(method.snippet_to_freq['1_1_2_1'] == 100)
-        assert(method.snippet_to_freq['1_3_1_1'] == 100)
-        assert(method.snippet_to_freq['1_3_4_1'] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_2_1')] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_3_1_1')] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_3_4_1')] == 100)
 
-        assert(method.snippet_to_freq['1_1_2_1|1_3_1_1'] == 100)
-        assert(method.snippet_to_freq['1_3_1_1|1_3_4_1'] == 100)
-        assert(method.snippet_to_freq['1_1_2_1|1_3_4_1'] == 0)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_2_1|1_3_1_1')] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_3_1_1|1_3_4_1')] == 100)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_2_1|1_3_4_1')] == 0)
 
-        assert(method.snippet_to_freq['1_1_2_1|1_3_1_1|1_3_4_1'] == 0)
+        assert(method.snippet_to_freq[method.extractor.parse('1_1_2_1|1_3_1_1|1_3_4_1')] == 0)
 
     def test_build_singleton_1(self):
         '''
@@ -363,11 +485,14 @@ class TestExtractor(unittest.TestCase):
             t += 1
             method.time += 1
             if t == 1:
-                assert(method.extractor.build_singleton(update, t) == (t, update, {'1', '2'}, None, '1_1_2_1'))
+                singleton = method.extractor.build_singleton(update, t)
+                assert((singleton.age, singleton.update, singleton.snippet) == (t, update, method.extractor.parse('1_1_2_1')))
             if t == 2:
-                assert(method.extractor.build_singleton(update, t) == (t, update, {'3', '1'}, None, '1_3_1_1'))
+                singleton = method.extractor.build_singleton(update, t)
+                assert((singleton.age, singleton.update, singleton.snippet) == (t, update, method.extractor.parse('1_3_1_1')))
             if t == 3:
-                assert(method.extractor.build_singleton(update, t) == (t, update, {'3', '4'}, None, '1_3_4_1'))
+                singleton = method.extractor.build_singleton(update, t)
+                assert((singleton.age, singleton.update, singleton.snippet) == (t, update, method.extractor.parse('1_3_4_1')))
 
     def test_build_singleton_2(self):
         '''
@@ -383,11 +508,17 @@ class TestExtractor(unittest.TestCase):
             t += 1
             method.time += 1
             if t == 1:
-                assert(method.extractor.build_singleton(update, t) == (t, update, {'1', '2'}, {'1': 0, '2': 1}, '1_0_1_1'))
+                singleton = method.extractor.build_singleton(update, t)
+                assert((singleton.age, singleton.update, singleton.snippet) == (t, update, method.extractor.parse('1_0_1_1')))
+                assert(singleton.labels == (update[0], update[4], update[5], update[6]))
             if t == 2:
-                assert(method.extractor.build_singleton(update, t) == (t, update, {'3', '1'}, {'3': 0, '1': 1}, '1_0_1_1'))
+                singleton = method.extractor.build_singleton(update, t)
+                assert((singleton.age, singleton.update, singleton.snippet) == (t, update, method.extractor.parse('1_0_1_1')))
+                assert(singleton.labels == (update[0], update[4], update[5], update[6]))
             if t == 3:
-                assert(method.extractor.build_singleton(update, t) == (t, update, {'3', '4'}, {'3': 0, '4': 1}, '1_0_1_1'))
+                singleton = method.extractor.build_singleton(update, t)
+                assert((singleton.age, singleton.update, singleton.snippet) == (t, update, method.extractor.parse('1_0_1_1')))
+                assert(singleton.labels == (update[0], update[4], update[5], update[6]))
 
     def test_build_snippet_from_1(self):
         '''
@@ -405,7 +536,7 @@ class TestExtractor(unittest.TestCase):
             method.time = update[-1]
             method.process_update(update)
 
-        assert(method.num_occs['1_0_1_1|1_2_0_1|1_2_3_1'] == 1)
+        assert(method.num_occs[method.extractor.parse('1_0_1_1|1_2_0_1|1_2_3_1')] == 1)
 
     def test_build_snippet_from_2(self):
         '''
@@ -423,8 +554,8 @@ class TestExtractor(unittest.TestCase):
             method.time = update[-1]
             method.process_update(update)
 
-        assert(method.num_occs['1_1_3_1|1_4_2_1'] == 0)
-        assert(method.num_occs['1_1_3_1|1_4_2_1|1_2_1_1'] == 1)
+        assert(method.num_occs[method.extractor.parse('1_1_3_1|1_4_2_1')] == 0)
+        assert(method.num_occs[method.extractor.parse('1_1_3_1|1_4_2_1|1_2_1_1')] == 1)
 
     def test_build_snippet_from_3(self):
         '''
@@ -442,9 +573,9 @@ class TestExtractor(unittest.TestCase):
             method.time = update[-1]
             method.process_update(update)
 
-        assert(method.num_occs['1_0_1_1|1_2_3_1'] == 0)
-        assert(method.num_occs['1_0_1_1|1_2_0_1'] == 1)
-        assert(method.num_occs['1_0_1_1|1_2_3_1|1_3_0_1'] == 1)
+        assert(method.num_occs[method.extractor.parse('1_0_1_1|1_2_3_1')] == 0)
+        assert(method.num_occs[method.extractor.parse('1_0_1_1|1_2_0_1')] == 1)
+        assert(method.num_occs[method.extractor.parse('1_0_1_1|1_2_3_1|1_3_0_1')] == 1)
 
 
 if __name__ == "__main__":
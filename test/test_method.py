@@ -1,14 +1,47 @@
 import unittest
 import sys
+import os
+import json
+import tempfile
+import shutil
 import numpy as np
 from collections import defaultdict
 sys.path.append('../src/')
 from stream import Stream
 from sPENminer import sPENminer
 from oPENminer import oPENminer
+from miner_group import MinerGroup
+from sharded_miner import ShardedMiner, time_blocks
+from count_min_sketch import CountMinSketch
+from exponent_grid import persistence_grid, parse_grid
+from stream import binary_path, index_path
+import checkpoint
+import main
 from math import log2 as log
 from math import log10
 
+def random_updates(seed, n, max_node, max_step=3, bursts=False, edge_labels=False):
+    '''
+    :return: n random updates between the nodes 1 to max_node, labeled by their ids mod 3, whose timestamps advance by less than max_step at a time
+    (or, with bursts, in bursts of updates with the same timestamp), and whose edge labels are 1 (or, with edge_labels, 1 or 2).
+    '''
+    rng = np.random.RandomState(seed)
+    steps = rng.randint(0, 2, n) * rng.randint(1, 4, n) if bursts else rng.randint(0, max_step, n)
+    updates = list()
+    for t in np.cumsum(steps):
+        u, v = rng.randint(1, max_node + 1, 2)
+        edge_label = str(rng.randint(1, 3)) if edge_labels else '1'
+        updates.append(('1', str(u), str(v), '1', str(u % 3), str(v % 3), edge_label, int(t)))
+    return updates
+
+def write_updates(path, updates):
+    '''
+    Writes updates as an edgelist, with a date column before the timestamp (like timestamped.txt).
+    '''
+    with open(path, 'w') as f:
+        for update in updates:
+            f.write('{},2020-01-01,{}\n'.format(','.join(update[:-1]), update[-1]))
+
 class TestMethod(unittest.TestCase):
     def test_init_1(self):
         '''
@@ -76,7 +109,7 @@ class TestMethod(unittest.TestCase):
         for t, update in enumerate(updates):
             method.process_update(update)
         assert(len(method.num_occs.keys()) == 6)
-        assert('1_1_2_1|1_3_1_1' in method.num_occs.keys())
+        assert(method.extractor.parse('1_1_2_1|1_3_1_1') in method.num_occs.keys())
 
     def test_process_update_5(self):
         '''
@@ -89,5 +122,368 @@ class TestMethod(unittest.TestCase):
             method.process_update(update)
         assert(len(method.num_occs.keys()) == 7)
 
+    def test_snippet_stats_1(self):
+        '''
+        Test that the stats are kept as columns indexed by snippet ids, and that the dict-like views read and write them.
+        '''
+        method = sPENminer(Stream('../test/timestamped'), window_size=3, max_size=3, save_output=False)
+        method.mine(verbose=False)
+        stats = method.stats
+        assert(len(stats) == len(stats.ids) == len(stats.snippets) == len(method.num_occs))
+        assert(stats.num_occs.typecode == 'q' and stats.gap_logs.typecode == 'd')
+        for snippet, i in stats.ids.items():
+            assert(stats.snippets[i] == snippet)
+            assert(method.num_occs[snippet] == stats.num_occs[i] > 0)
+            assert(method.first_occs[snippet] == stats.first_occs[i] <= stats.last_occs[i] == method.last_occs[snippet])
+            assert(method.old_Ps[snippet] == method.persistence(i, stats.last_occs[i]) and method.S(i) >= 1)
+        # untracked snippets
+        snippet = (1, 'x', 'y', 'z')
+        assert(snippet not in method.num_occs and snippet not in method.old_Ps)
+        assert(method.num_occs[snippet] == 0 and method.num_gaps[snippet] == 0)
+        assert(method.old_Ps.get(snippet) is None)
+        method.last_occs[snippet] = 10
+        assert(snippet in method.num_occs and snippet not in method.old_Ps)
+        assert(method.first_occs[snippet] == 10)
+        # weighted (sampled) occurrences are fractional
+        assert(sPENminer(None, window_size=3, max_size=3, budget=1).stats.num_occs.typecode == 'd')
+
+    def test_capacity_1(self):
+        '''
+        Test that a bounded sPENminer tracks at most capacity snippets, and is exact when nothing is evicted.
+        '''
+        updates = random_updates(2, 1000, 19)
+        method = sPENminer(None, window_size=3, max_size=3)
+        unbounded = sPENminer(None, window_size=3, max_size=3, capacity=10 ** 6)
+        bounded = sPENminer(None, window_size=3, max_size=3, capacity=50)
+        for update in updates:
+            for m in [method, unbounded, bounded]:
+                m.process_update(update)
+            assert(len(bounded.stats) <= 50)
+        assert(method.old_Ps == unbounded.old_Ps)
+        assert(unbounded.sketch.num_adds == 0)
+        assert(bounded.sketch.num_adds > 0 and bounded.sketch.num_estimates > 0)
+        # the most persistent snippets are kept, and the first occurrences of the others are bounded
+        top = sorted(method.stats.ids, key=method.query, reverse=True)[:5]
+        assert(set(top) <= set(bounded.stats.ids))
+        for snippet in method.stats.ids:
+            if snippet not in bounded.stats.ids:
+                assert(bounded.sketch.estimate(snippet)[0] <= method.first_occs[snippet])
+
+    def test_capacity_2(self):
+        '''
+        Test that the snippets that were never evicted are exact, even after many evictions.
+        '''
+        method = sPENminer(None, window_size=3, max_size=3)
+        bounded = sPENminer(None, window_size=3, max_size=3, capacity=100, epsilon=0.01)
+        # record the evicted snippets
+        evicted = set()
+        add = bounded.sketch.add
+        def record(snippet, *stats):
+            evicted.add(snippet)
+            add(snippet, *stats)
+        bounded.sketch.add = record
+        columns = ('first_occs', 'last_occs', 'num_occs', 'num_gaps', 'gap_logs')
+        num_checked = 0
+        for n, update in enumerate(random_updates(2, 2000, 39)):
+            method.process_update(update)
+            bounded.process_update(update)
+            if n % 50 == 49:
+                for snippet, i in bounded.stats.ids.items():
+                    if snippet not in evicted:
+                        j = method.stats.ids[snippet]
+                        assert([getattr(bounded.stats, name)[i] for name in columns] == [getattr(method.stats, name)[j] for name in columns])
+                        num_checked += 1
+        assert(bounded.sketch.num_adds > 2000 and num_checked > 500)
+
+    def test_top_1(self):
+        '''
+        Test that the top-k snippets, queried while mining, are the most persistent ones.
+        '''
+        method = sPENminer(None, window_size=3, max_size=3)
+        for n, update in enumerate(random_updates(3, 500, 9)):
+            method.process_update(update)
+            if n % 50 == 49:
+                Ps = sorted((method.query(snippet) for snippet in method.stats.ids), reverse=True)
+                top = method.top(10)
+                assert(len(top) == 10)
+                assert(np.allclose([P for _, P in top], Ps[:10]))
+                assert(all(method.query(snippet) == P for snippet, P in top))
+        assert(len(method.top_heap) <= 2 * len(method.stats) + 64)
+        assert(len(method.top(10 ** 6)) == len(method.stats))
+
+    def test_checkpoint_1(self):
+        '''
+        Test that resuming from a checkpoint gives the same results as an uninterrupted run.
+        '''
+        write_updates('checkpointed.txt', random_updates(4, 300, 9))
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'checkpointed.ckpt')
+        try:
+            for binary, intern, budget, capacity in [(False, False, None, None), (False, True, 2, None), (True, True, None, 40)]:
+                kwargs = dict(window_size=3, max_size=3, save_output=False, budget=budget, capacity=capacity)
+                method = sPENminer(Stream('../test/checkpointed', binary=binary, intern=intern), **kwargs)
+                method.mine(verbose=False)
+                # mine the first 250 updates, with checkpoints every 100, then "crash"
+                crashed = sPENminer(Stream('../test/checkpointed', binary=binary, intern=intern), **kwargs)
+                for n, update in enumerate(crashed.stream.flow()):
+                    crashed.process_update(update)
+                    crashed.num_updates += 1
+                    if crashed.num_updates % 100 == 0:
+                        checkpoint.save(crashed, path)
+                    if n == 249:
+                        break
+                assert(not os.path.exists('{}.tmp'.format(path)))
+                resumed = checkpoint.load(path, Stream('../test/checkpointed', binary=binary, intern=intern))
+                assert(resumed.num_updates == 200)
+                resumed.mine(verbose=False, checkpoint_path=path, checkpoint_every=50)
+                assert(resumed.num_updates == 300)
+                assert(resumed.stream.nodes.tokens == method.stream.nodes.tokens)
+                assert(resumed.num_occs == method.num_occs)
+                assert(resumed.old_Ps == method.old_Ps)
+                assert(resumed.top(5) == method.top(5))
+                assert([singleton.update for singleton in resumed.extractor.singletons] == [singleton.update for singleton in method.extractor.singletons])
+                os.remove(path)
+        finally:
+            os.remove('checkpointed.txt')
+            shutil.rmtree(directory)
+            if os.path.exists(binary_path('../test/checkpointed')[1]):
+                shutil.rmtree(binary_path('../test/checkpointed')[1])
+
+    def test_checkpoint_2(self):
+        '''
+        Test that a checkpoint is not resumed with a different stream, a changed edgelist, or different parameters.
+        '''
+        with open('checkpointed.txt', 'w') as f:
+            for t in range(100):
+                f.write('1,{},{},1,a,b,1,2020-01-01,{}\n'.format(t % 7, t % 5, t))
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'checkpointed.ckpt')
+        try:
+            method = sPENminer(Stream('../test/checkpointed'), window_size=3, max_size=3, save_output=False)
+            method.mine(verbose=False, checkpoint_path=path, checkpoint_every=50)
+            assert(checkpoint.load(path, Stream('../test/checkpointed'), method).num_updates == 100)
+            with self.assertRaises(ValueError):
+                checkpoint.load(path, Stream('../test/checkpointed', start=10))
+            with self.assertRaises(ValueError):
+                checkpoint.load(path, Stream('../test/checkpointed'), sPENminer(None, window_size=4, max_size=3))
+            with open('checkpointed.txt', 'a') as f:
+                f.write('1,1,2,1,a,b,1,2020-01-01,100\n')
+            with self.assertRaises(ValueError):
+                checkpoint.load(path, Stream('../test/checkpointed'))
+        finally:
+            os.remove('checkpointed.txt')
+            shutil.rmtree(directory)
+            if os.path.exists(index_path('../test/checkpointed')):
+                os.remove(index_path('../test/checkpointed'))
+
+    def test_report_1(self):
+        '''
+        Test that the periodic reports hold the top-k snippets at the time they are written.
+        '''
+        write_updates('reported.txt', random_updates(7, 300, 9))
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'reported.jsonl')
+        try:
+            for report_unit, report_every in [('time', 50), ('updates', 100)]:
+                method = sPENminer(Stream('../test/reported'), window_size=3, max_size=3, save_output=False)
+                method.mine(verbose=False, report_path=path, report_every=report_every, report_unit=report_unit, report_k=3)
+                with open(path) as f:
+                    records = [json.loads(line) for line in f]
+                os.remove(path)
+                progress = [record['time' if report_unit == 'time' else 'updates'] - (method.ts if report_unit == 'time' else 0) for record in records]
+                assert(len(records) == progress[-1] // report_every + 1 and records[-1]['updates'] == 300)
+                assert([p // report_every for p in progress[:-1]] == list(range(1, len(records))))
+                # the same top-k as a miner stopped at each report
+                reference = sPENminer(Stream('../test/reported'), window_size=3, max_size=3, save_output=False)
+                updates = iter(reference.stream.flow())
+                for record in records:
+                    while reference.num_updates < record['updates']:
+                        reference.process_update(next(updates))
+                        reference.num_updates += 1
+                    assert(record['snippets'] == len(reference.stats))
+                    assert(record['top'] == [[reference.stream.decode(x, 'id'), P] for x, P in reference.top(3)])
+            # without an interval, only the end is reported
+            method = sPENminer(Stream('../test/reported'), window_size=3, max_size=3, save_output=False)
+            method.mine(verbose=False, report_path=path, report_k=3)
+            with open(path) as f:
+                records = [json.loads(line) for line in f]
+            os.remove(path)
+            assert(len(records) == 1 and records[0]['updates'] == 300)
+            assert(records[0]['top'] == [[method.stream.decode(x, 'id'), P] for x, P in method.top(3)])
+            with self.assertRaises(ValueError):
+                method.mine(verbose=False, report_path=path, report_every=10, report_unit='seconds')
+        finally:
+            os.remove('reported.txt')
+            shutil.rmtree(directory)
+
+    def test_sharded_1(self):
+        '''
+        Test that a sharded miner, whose workers mine consecutive time ranges, gives the same results as a serial run.
+        '''
+        write_updates('sharded.txt', random_updates(5, 500, 11, bursts=True, edge_labels=True))
+        try:
+            for kwargs, view, budget, batch_timestamps in [(dict(), 'id', None, False), (dict(binary=True, intern=True), 'label', None, False),
+                                                           (dict(intern=True, start=100, end=300), 'order', None, True), (dict(), 'label', 2, False)]:
+                method = sPENminer(Stream('../test/sharded', **kwargs), window_size=3, max_size=3, view=view, budget=budget, save_output=False)
+                for update in method.stream.flow():
+                    method.process_update(update)
+                miner = sPENminer(Stream('../test/sharded', **kwargs), window_size=3, max_size=3, view=view, budget=budget, batch_timestamps=batch_timestamps, save_output=False)
+                sharded = ShardedMiner(miner, num_workers=3)
+                assert(len(time_blocks(miner.stream, 3)) > 1)
+                rows = sharded.gather()
+                expected = [(method.stream.decode(x, view), method.query(x), method.num_occs[x]) for x in method.stats.ids]
+                rows = [(miner.stream.decode(x, view), P, freq) for x, P, freq in rows]
+                if budget:
+                    # the samples differ, but the singletons are never sampled
+                    assert({x: freq for x, _, freq in rows if '|' not in x} == {x: freq for x, _, freq in expected if '|' not in x})
+                    continue
+                assert(rows == expected)
+                assert(miner.num_updates == sum(1 for _ in Stream('../test/sharded', **kwargs).flow()))
+                assert([miner.stream.decode(x, view) for x, _ in sharded.top(5)] == [method.stream.decode(x, view) for x, _ in method.top(5)])
+        finally:
+            os.remove('sharded.txt')
+            for path in (binary_path('../test/sharded')[1], index_path('../test/sharded')):
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                elif os.path.exists(path):
+                    os.remove(path)
+
+    def test_grid_1(self):
+        '''
+        Test that the outputs for a grid of exponents, from one pass, match separate runs with each triple.
+        '''
+        updates = random_updates(6, 300, 7)
+        grid = [(alpha, beta, gamma) for alpha in [0.5, 1, 2] for beta in [1, 2] for gamma in [1, 3]]
+        for miner in [sPENminer, oPENminer]:
+            method = miner(None, window_size=3, max_size=3, grid=grid)
+            assert(len(method.grid) == len(grid) - 1)
+            for update in updates:
+                method.process_update(update)
+            saved = dict()
+            if miner is sPENminer:
+                ids, grid_Ps = method.grid_scores(method.grid)
+                for exponents, Ps in zip(method.grid, grid_Ps):
+                    saved[exponents] = {method.stats.snippets[i]: P for i, P in zip(ids, Ps)}
+            else:
+                method.compute_persistence()
+            for alpha, beta, gamma in method.grid:
+                separate = miner(None, window_size=3, max_size=3, alpha=alpha, beta=beta, gamma=gamma)
+                for update in updates:
+                    separate.process_update(update)
+                if miner is sPENminer:
+                    Ps = {x: separate.query(x) for x in separate.stats.ids}
+                else:
+                    separate.compute_persistence()
+                    Ps = separate.Ps
+                    # the components are only kept for a grid
+                    assert(not separate.components)
+                    W, F, S = np.array(list(method.components.values())).T
+                    saved[(alpha, beta, gamma)] = dict(zip(method.components, persistence_grid(W, F, S, [(alpha, beta, gamma)])[0]))
+                assert(Ps.keys() == saved[(alpha, beta, gamma)].keys())
+                assert(all(abs(P - saved[(alpha, beta, gamma)][x]) <= 1e-12 * P for x, P in Ps.items()))
+
+    def test_grid_2(self):
+        '''
+        Test that the exponents parsed from the arguments name the output files as before the grid.
+        '''
+        assert(parse_grid(None, None, None) == [(1, 1, 1)])
+        assert(parse_grid('0.5,2', None, '1') == [(0.5, 1, 1.0), (2.0, 1, 1.0)])
+        for exponents, suffix in [((1, 1, 1), 'exps_1_1_1'), ((2.0, 1, 1), 'exps_2.0_1_1')]:
+            alpha, beta, gamma = exponents
+            method = sPENminer(Stream('../test/timestamped'), window_size=3, max_size=3, alpha=alpha, beta=beta, gamma=gamma, save_output=False)
+            assert(method.base_path().endswith(suffix))
+        # the anomaly and data stream methods only score one combination
+        argv = sys.argv
+        try:
+            for flag in ['-a', '-data_stream']:
+                sys.argv = ['main.py', '-s', '../test/timestamped', flag, 'True', '--alpha', '0.5,2']
+                with self.assertRaises(ValueError):
+                    main.main(main.parse_args())
+        finally:
+            sys.argv = argv
+
+    def test_batch_timestamps_1(self):
+        '''
+        Test that adding the occurrences once per timestamp gives the same stats and scores as once per update.
+        '''
+        # bursts of updates with the same timestamp
+        updates = random_updates(6, 600, 9, bursts=True)
+        method = sPENminer(None, window_size=3, max_size=3)
+        batched = sPENminer(None, window_size=3, max_size=3, batch_timestamps=True)
+        for n, update in enumerate(updates):
+            method.process_update(update)
+            batched.process_update(update)
+            if n % 100 == 50:
+                assert(batched.top(5) == method.top(5))
+        assert(len(batched.freq_of_current) > 0)
+        assert([batched.query(x) for x in method.stats.ids] == [method.query(x) for x in method.stats.ids])
+        assert(len(batched.freq_of_current) == 0)
+        for name in ('first_occs', 'last_occs', 'num_occs', 'num_gaps', 'gap_logs'):
+            assert(getattr(batched.stats, name) == getattr(method.stats, name))
+
+    def test_count_min_sketch_1(self):
+        '''
+        Test that the sketch bounds the statistics of the snippets added to it.
+        '''
+        sketch = CountMinSketch(epsilon=0.1, delta=0.1)
+        assert((sketch.depth, sketch.width) == (3, 28))
+        stats = {(1, i, i + 1, 0): (i, i + 5, i + 1, i % 4, 1 + i / 100) for i in range(100)}
+        for snippet, (tf, tl, num_occs, num_gaps, gap_logs) in stats.items():
+            sketch.add(snippet, tf, tl, num_occs, num_gaps, gap_logs)
+        for snippet, (tf, tl, num_occs, num_gaps, gap_logs) in stats.items():
+            first_occ, last_occ, est_num_occs, est_num_gaps, est_gap_logs = sketch.estimate(snippet)
+            assert(first_occ <= tf and last_occ >= tl and est_num_occs >= num_occs and est_num_gaps >= num_gaps and est_gap_logs >= gap_logs)
+        assert(CountMinSketch().estimate((1, 0, 1, 0)) is None)
+
+    def test_miner_group_1(self):
+        '''
+        Test that a group mines several views in one pass like separate miners.
+        '''
+        updates = random_updates(0, 200, 7, max_step=2, edge_labels=True)
+        views = ['id', 'label', 'order']
+        for max_size in [2, 3, 4]:
+            methods = [sPENminer(None, window_size=3, max_size=max_size, view=view) for view in views]
+            offline_methods = [oPENminer(None, window_size=3, max_size=max_size, view=view) for view in views]
+            group = MinerGroup([sPENminer(None, window_size=3, max_size=max_size, view=view) for view in views])
+            offline_group = MinerGroup([oPENminer(None, window_size=3, max_size=max_size, view=view) for view in views])
+            for update in updates:
+                for method in methods + offline_methods:
+                    method.process_update(update)
+                group.process_update(update)
+                offline_group.process_update(update)
+            for method, grouped in zip(methods, group.miners):
+                assert(dict(method.num_occs) == dict(grouped.num_occs))
+                assert(method.old_Ps == grouped.old_Ps)
+            for method, grouped in zip(offline_methods, offline_group.miners):
+                assert(dict(method.snippet_to_occs) == dict(grouped.snippet_to_occs))
+
+    def test_miner_group_2(self):
+        '''
+        Test that the miners of a group must share their max_size.
+        '''
+        with self.assertRaises(ValueError):
+            MinerGroup([sPENminer(None, window_size=3, max_size=3, view='id'), sPENminer(None, window_size=3, max_size=2, view='label')])
+
+    def test_miner_group_3(self):
+        '''
+        Test that a group mines several window sizes (and views) in one pass like separate miners.
+        '''
+        updates = random_updates(1, 200, 7)
+        settings = [(view, window_size) for view in ['id', 'order'] for window_size in [5, 1, 3]]
+        for max_size in [2, 3, 4]:
+            methods = [sPENminer(None, window_size=window_size, max_size=max_size, view=view) for view, window_size in settings]
+            group = MinerGroup([sPENminer(None, window_size=window_size, max_size=max_size, view=view) for view, window_size in settings])
+            assert(group.extractor.window_size == 5)
+            for update in updates:
+                for method in methods:
+                    method.process_update(update)
+                group.process_update(update)
+            for method, grouped in zip(methods, group.miners):
+                assert(dict(method.num_occs) == dict(grouped.num_occs))
+                assert(method.old_Ps == grouped.old_Ps)
+            # smaller windows find fewer snippets
+            assert(sum(group.miners[1].num_occs.values()) < sum(group.miners[2].num_occs.values()) < sum(group.miners[0].num_occs.values()))
+
+
 if __name__ == "__main__":
     unittest.main()
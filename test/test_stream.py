@@ -0,0 +1,262 @@
+import unittest
+import sys
+import os
+import shutil
+import gzip
+import bz2
+import lzma
+import zipfile
+import socket
+import tempfile
+import threading
+import numpy as np
+sys.path.append('../src/')
+from stream import Stream, convert, binary_path, build_index, index_path
+from live_stream import LiveStream, produce
+from sPENminer import sPENminer
+
+def decoded(method, stats):
+    '''
+    :return: the stats of the method (e.g., num_occs) keyed by the rendered snippets, which compare across text, binary, and interned streams.
+    '''
+    return {method.stream.decode(snippet, method.view): value for snippet, value in stats.items()}
+
+class TestStream(unittest.TestCase):
+    name = '../test/timestamped'
+
+    def tearDown(self):
+        _, cols_dir = binary_path(self.name)
+        if os.path.exists(cols_dir):
+            shutil.rmtree(cols_dir)
+        if os.path.exists(index_path(self.name)):
+            os.remove(index_path(self.name))
+
+    def test_binary_1(self):
+        '''
+        Test that the binary stream yields the same updates as the text stream.
+        '''
+        text = list(Stream(self.name).flow())
+        binary = list(Stream(self.name, binary=True).flow())
+        assert(len(text) == len(binary) == 8)
+        for text_update, binary_update in zip(text, binary):
+            assert(int(text_update[0]) == binary_update[0])
+            assert(tuple(text_update[1:7]) == binary_update[1:7])
+            assert(int(text_update[-1]) == binary_update[-1])
+
+    def test_binary_2(self):
+        '''
+        Test that the conversion is reused, and that mining the binary stream gives the same snippets.
+        '''
+        cols_dir = convert(self.name)
+        mtime = os.path.getmtime(os.path.join(cols_dir, 'vocab.json'))
+        stream = Stream(self.name, binary=True)
+        assert(os.path.getmtime(os.path.join(cols_dir, 'vocab.json')) == mtime)
+        assert(stream.num_updates() == 8)
+        with self.assertRaises(TypeError):
+            Stream(self.name).num_updates()
+        assert(Stream(self.name))
+        assert(stream.nodes.tokens == ['1', '2', '3', '4', '5', '6'])
+
+        text_method = sPENminer(Stream(self.name), window_size=3, max_size=3, save_output=False)
+        text_method.mine(verbose=False)
+        binary_method = sPENminer(stream, window_size=3, max_size=3, save_output=False)
+        binary_method.mine(verbose=False)
+        assert(decoded(text_method, text_method.num_occs) == decoded(binary_method, binary_method.num_occs))
+
+    def test_binary_3(self):
+        '''
+        Test that weights are kept as they are, even if they are not numbers.
+        '''
+        with open('weighted.txt', 'w') as f, open('timestamped.txt', 'r') as g:
+            for n, line in enumerate(g):
+                update = line.strip().split(',')
+                update[3] = ['heavy', 'light', '0.5'][n % 3]
+                f.write(','.join(update) + '\n')
+        try:
+            text = list(Stream('../test/weighted').flow())
+            assert([update[3] for update in text[:3]] == ['heavy', 'light', '0.5'])
+            for binary, intern in [(False, True), (True, False), (True, True)]:
+                stream = Stream('../test/weighted', binary=binary, intern=intern)
+                assert([update[3] for update in stream.flow()] == [update[3] for update in text])
+        finally:
+            os.remove('weighted.txt')
+            _, cols_dir = binary_path('../test/weighted')
+            if os.path.exists(cols_dir):
+                shutil.rmtree(cols_dir)
+
+    def test_intern_1(self):
+        '''
+        Test that interned streams encode ids and labels densely, for both text and binary streams.
+        '''
+        for binary in [False, True]:
+            stream = Stream(self.name, binary=binary, intern=True)
+            updates = list(stream.flow())
+            assert(updates[0] == (1, 0, 1, '1', 0, 1, 0, 1))
+            assert(updates[1] == (1, 2, 0, '1', 2, 0, 0, 1))
+            assert(updates[3][0] == -1)
+            assert(stream.nodes.decode(updates[4][1]) == '5')
+            assert(stream.decode((1, 0, 1, 0, 1, 2, 0, 0), 'id') == '1_1_2_x|1_3_1_x')
+            assert(stream.decode((1, 0, 1, 0, 1, 2, 0, 0), 'label') == '1_a_b_x|1_c_a_x')
+            assert(stream.decode((1, 0, 1, 0, 1, 2, 0, 0), 'order') == '1_0_1_x|1_2_0_x')
+
+    def test_intern_2(self):
+        '''
+        Test that mining an interned stream finds the same snippets, in all views.
+        '''
+        for view in ['id', 'label', 'order']:
+            method = sPENminer(Stream(self.name), window_size=3, max_size=3, view=view, save_output=False)
+            method.mine(verbose=False)
+            for binary in [False, True]:
+                stream = Stream(self.name, binary=binary, intern=True)
+                interned_method = sPENminer(stream, window_size=3, max_size=3, view=view, save_output=False)
+                interned_method.mine(verbose=False)
+                assert(decoded(interned_method, interned_method.num_occs) == decoded(method, method.num_occs))
+
+    def test_intern_3(self):
+        '''
+        Test that mining an interned stream gives the same output as the original tokens, in all views,
+        when many updates share a timestamp (so the singletons of snippets are ordered by their tokens).
+        '''
+        rng = np.random.RandomState(0)
+        with open('interned.txt', 'w') as f:
+            for t in np.cumsum(rng.randint(0, 2, 500)):
+                u, v = rng.randint(1, 30, 2)
+                f.write('1,{},{},1,L{},L{},{},2020-01-01,{}\n'.format(u, v, u % 12, v % 12, rng.choice(['x', 'y', 'z10', 'z2']), t))
+        try:
+            for view in ['id', 'label', 'order']:
+                for max_size in [3, 4]:
+                    method = sPENminer(Stream('../test/interned'), window_size=3, max_size=max_size, view=view, save_output=False)
+                    method.mine(verbose=False)
+                    for binary in [False, True]:
+                        interned_method = sPENminer(Stream('../test/interned', binary=binary, intern=True), window_size=3, max_size=max_size, view=view, save_output=False)
+                        interned_method.mine(verbose=False)
+                        assert(decoded(interned_method, interned_method.num_occs) == decoded(method, method.num_occs))
+                        assert(decoded(interned_method, interned_method.old_Ps) == decoded(method, method.old_Ps))
+        finally:
+            os.remove('interned.txt')
+            _, cols_dir = binary_path('../test/interned')
+            if os.path.exists(cols_dir):
+                shutil.rmtree(cols_dir)
+
+    def test_time_range_1(self):
+        '''
+        Test that time ranges are read the same from text (with and without the index), binary, and compressed streams.
+        '''
+        updates = list(Stream(self.name).flow())
+        for start, end in [(2, 7), (3, 4), (None, 1), (5, None), (10, 20)]:
+            expected = [tuple(update[1:3]) for update in updates if (start is None or int(update[-1]) >= start) and (end is None or int(update[-1]) <= end)]
+            for binary in [False, True]:
+                stream = Stream(self.name, binary=binary, start=start, end=end)
+                assert([tuple(update[1:3]) for update in stream.flow()] == expected)
+            # an index entry for every timestamp
+            assert(len(build_index(self.name, stride=1)) == 5)
+            stream = Stream(self.name, start=start, end=end)
+            assert([tuple(update[1:3]) for update in stream.flow()] == expected)
+            os.remove(index_path(self.name))
+        with open('timestamped.txt', 'rb') as f, gzip.open('compressed.txt.gz', 'wb') as g:
+            g.write(f.read())
+        try:
+            assert([tuple(update[1:3]) for update in Stream('../test/compressed', start=2, end=7).flow()] == [tuple(update[1:3]) for update in updates[2:7]])
+        finally:
+            os.remove('compressed.txt.gz')
+
+    def test_time_range_2(self):
+        '''
+        Test that the index seeks past the updates before the range.
+        '''
+        index = build_index(self.name, stride=1)
+        assert(index.tolist() == [[1, 0], [2, 54], [4, 81], [7, 163], [9, 190]])
+        stream = Stream(self.name, start=4)
+        assert(stream.f.tell() == 81)
+        assert(next(stream.flow()) == ['-1', '1', '2', '1', 'a', 'b', 'x', '2020-01-01', '4'])
+        assert(stream.name == '../test/timestamped_from_4_to_None')
+
+    def test_live_1(self):
+        '''
+        Test that sPENminer mines a stream from TCP and Unix sockets like the file.
+        '''
+        method = sPENminer(Stream(self.name), window_size=3, max_size=3, save_output=False)
+        method.mine(verbose=False)
+        directory = tempfile.mkdtemp()
+        try:
+            for source, family in [('tcp:localhost:0', socket.AF_INET), ('unix:{}/live.sock'.format(directory), socket.AF_UNIX)]:
+                stream = LiveStream(source, intern=True, max_chunks=1)
+                producer = threading.Thread(target=produce, args=(stream.address, 'timestamped.txt'), kwargs={'family': family})
+                producer.start()
+                live_method = sPENminer(stream, window_size=3, max_size=3, save_output=False)
+                live_method.mine(verbose=False)
+                producer.join()
+                assert(decoded(live_method, live_method.num_occs) == decoded(method, method.num_occs))
+                assert(stream.report().startswith('Live stream: 8 updates'))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_live_2(self):
+        '''
+        Test reading from a named pipe.
+        '''
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'fifo')
+            os.mkfifo(path)
+            stream = LiveStream('fifo:{}'.format(path))
+
+            def write():
+                with open(path, 'w') as f, open('timestamped.txt', 'r') as g:
+                    f.write(g.read())
+            producer = threading.Thread(target=write)
+            producer.start()
+            assert(list(stream.flow()) == list(Stream(self.name).flow()))
+            producer.join()
+        finally:
+            shutil.rmtree(directory)
+
+    def test_compressed_1(self):
+        '''
+        Test that gzip, bz2, xz, and zip edgelists are read like the uncompressed one.
+        '''
+        text = list(Stream(self.name).flow())
+        with open('timestamped.txt', 'rb') as f:
+            data = f.read()
+        for ext, opener in [('gz', gzip.open), ('bz2', bz2.open), ('xz', lzma.open)]:
+            with opener('compressed.txt.{}'.format(ext), 'wb') as f:
+                f.write(data)
+            try:
+                stream = Stream('../test/compressed')
+                assert(list(stream.flow()) == text)
+                stream.f.close()
+            finally:
+                os.remove('compressed.txt.{}'.format(ext))
+        with zipfile.ZipFile('archive.zip', 'w', compression=zipfile.ZIP_DEFLATED) as z:
+            z.writestr('compressed.txt', data)
+            z.writestr('other.txt', data)
+        try:
+            assert(list(Stream('../test/compressed').flow()) == text)
+            method = sPENminer(Stream('../test/compressed', binary=True), window_size=3, max_size=3, save_output=False)
+            method.mine(verbose=False)
+            assert(sum(method.num_occs.values()) > len(text))
+        finally:
+            os.remove('archive.zip')
+            shutil.rmtree(binary_path('../test/compressed')[1])
+
+    def test_compressed_2(self):
+        '''
+        Test that closing a compressed stream early stops its decompression thread.
+        '''
+        with open('timestamped.txt', 'rb') as f:
+            data = f.read()
+        with gzip.open('compressed.txt.gz', 'wb') as f:
+            f.write(data * 1000)
+        try:
+            stream = Stream('../test/compressed')
+            stream.f.chunk_size = 64
+            updates = stream.flow()
+            assert(next(updates) == ['1', '1', '2', '1', 'a', 'b', 'x', '2020-01-01', '1'])
+            stream.f.close()
+            assert(not stream.f.thread.is_alive())
+        finally:
+            os.remove('compressed.txt.gz')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,7 @@ import unittest
 from test_method import TestMethod
 from test_extractor import TestExtractor
 from test_P import TestP
+from test_stream import TestStream
 
 '''
 A script to run all the test cases.
@@ -10,9 +11,11 @@ A script to run all the test cases.
 method_suite = unittest.TestLoader().loadTestsFromTestCase(TestMethod)
 extractor_suite = unittest.TestLoader().loadTestsFromTestCase(TestExtractor)
 P_suite = unittest.TestLoader().loadTestsFromTestCase(TestP)
+stream_suite = unittest.TestLoader().loadTestsFromTestCase(TestStream)
 # combine the test suites
 suites = unittest.TestSuite([method_suite,
                              extractor_suite,
-                             P_suite])
+                             P_suite,
+                             stream_suite])
 # run the test suites
 unittest.TextTestRunner(verbosity=2).run(suites)